@@ -2,17 +2,54 @@ import streamlit as st
 import tempfile
 import os
 import io
+import shutil
 from pathlib import Path
 import time
 import json
+import hashlib
+import threading
+import copy
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
-# Import utility modules
-from utils.arabic_text import ArabicTextProcessor
-from utils.video_processor import VideoProcessor
-from utils.subtitle_renderer import SubtitleRenderer
-from utils.audio_handler import AudioHandler
-from utils.file_browser import FileBrowser
-from utils.youtube_downloader import YouTubeDownloader
+# Uploads are copied to disk in fixed-size chunks so memory stays bounded
+UPLOAD_CHUNK_SIZE = 16 * 1024 * 1024
+
+# Rendered previews kept per session for instant re-display
+PREVIEW_CACHE_SIZE = 8
+
+# Shown when a render worker process was killed (e.g. out of memory) mid-job
+RENDER_WORKER_DIED = "توقفت عملية المعالجة بشكل غير متوقع (ربما بسبب نفاد الذاكرة). يرجى المحاولة مرة أخرى"
+
+# Sessions idle longer than this no longer protect their files from cleanup
+MEDIA_IN_USE_TTL = 6 * 60 * 60
+
+# Saved subtitle setting presets
+PRESETS_FILE = "subtitle_presets.json"
+
+# Subtitle and audio settings defaults (like movie subtitles)
+DEFAULT_SETTINGS = {
+    'setting_font_family': "Noto Sans Arabic",
+    'setting_font_size': 42,
+    'setting_text_color': "#FFFFFF",
+    'setting_bg_color': "#000000",
+    'setting_stroke_width': 3,
+    'setting_stroke_color': "#000000",
+    'setting_bg_opacity': 0.0,
+    'setting_shadow_enabled': True,
+    'setting_shadow_offset_x': 3,
+    'setting_shadow_offset_y': 3,
+    'setting_shadow_blur': 5,
+    'setting_text_wrap_width': 45,
+    'setting_position': "أسفل",
+    'setting_alignment': "وسط",
+    'setting_margin_horizontal': 50,
+    'setting_margin_vertical': 60,
+    'setting_subtitle_offset': 0.0,
+    'setting_audio_offset': 0.0,
+    'setting_audio_volume': 1.0
+}
 
 # Configure page
 st.set_page_config(
@@ -22,14 +59,28 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Load custom CSS
+# Load custom CSS (read from disk only when the file changes)
+@st.cache_data(show_spinner=False)
+def read_css(mtime):
+    return Path("assets/style.css").read_text(encoding="utf-8")
+
 def load_css():
-    with open("assets/style.css", "r", encoding="utf-8") as f:
-        st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+    st.markdown(f"<style>{read_css(os.path.getmtime('assets/style.css'))}</style>", unsafe_allow_html=True)
 
 load_css()
 
 # Initialize session state
+# Saved presets are parsed once per file version, not on every rerun
+@st.cache_data(show_spinner=False)
+def load_presets(mtime):
+    with open(PRESETS_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def get_presets():
+    if not os.path.exists(PRESETS_FILE):
+        return {}
+    return load_presets(os.path.getmtime(PRESETS_FILE))
+
 def init_session_state():
     if 'video_file_path' not in st.session_state:
         st.session_state.video_file_path = None
@@ -43,22 +94,181 @@ def init_session_state():
         st.session_state.preview_ready = False
     if 'processed_video_path' not in st.session_state:
         st.session_state.processed_video_path = None
+    if 'preview_cache' not in st.session_state:
+        st.session_state.preview_cache = {}
+    if 'file_hashes' not in st.session_state:
+        st.session_state.file_hashes = {}
+    if 'upload_ids' not in st.session_state:
+        st.session_state.upload_ids = {}
+    if 'tmpdir' not in st.session_state:
+        # Per-session scratch space; TemporaryDirectory removes itself when
+        # the session state holding it is garbage collected
+        st.session_state.tmpdir = tempfile.TemporaryDirectory()
 
 init_session_state()
 
-# Initialize processors
+# Files each live session has selected, shared across sessions so cleanup of
+# shared directories can spare them: {session key: (monotonic time, paths)}
+@st.cache_resource
+def get_media_in_use():
+    return {}, threading.Lock()
+
+def register_media_in_use():
+    """Record this session's selected files; refreshed on every rerun"""
+    media_in_use, lock = get_media_in_use()
+    paths = (st.session_state.video_file_path, st.session_state.audio_file_path, st.session_state.subtitle_file_path)
+    with lock:
+        # The session's scratch directory name doubles as a unique session key
+        media_in_use[st.session_state.tmpdir.name] = (time.monotonic(), paths)
+
+register_media_in_use()
+
+# Initialize processors lazily, each once per process, so a session only
+# imports the heavy modules (moviepy, yt-dlp, ...) for the features it uses
+@st.cache_resource
+def get_arabic_processor():
+    from utils.arabic_text import ArabicTextProcessor
+    processor = ArabicTextProcessor()
+    # Warm up the shaper tables so the first render doesn't pay for them
+    processor.process_text("اختبار")
+    return processor
+
+@st.cache_resource
+def get_video_processor():
+    from utils.video_processor import VideoProcessor
+    return VideoProcessor()
+
+@st.cache_resource
+def get_subtitle_renderer():
+    from utils.subtitle_renderer import SubtitleRenderer
+    renderer = SubtitleRenderer()
+    renderer.preload_font()
+    return renderer
+
+@st.cache_resource
+def get_audio_handler():
+    from utils.audio_handler import AudioHandler
+    return AudioHandler()
+
+@st.cache_resource
+def get_file_browser():
+    from utils.file_browser import FileBrowser
+    return FileBrowser()
+
 @st.cache_resource
-def get_processors():
-    return {
-        'arabic_text': ArabicTextProcessor(),
-        'video': VideoProcessor(),
-        'subtitle': SubtitleRenderer(),
-        'audio': AudioHandler(),
-        'file_browser': FileBrowser(),
-        'youtube': YouTubeDownloader()
-    }
-
-processors = get_processors()
+def get_youtube_downloader():
+    from utils.youtube_downloader import YouTubeDownloader
+    return YouTubeDownloader()
+
+def prune_youtube_downloads(*new_paths):
+    """Trim the shared YouTube download directory, sparing files any live session still uses"""
+    media_in_use, lock = get_media_in_use()
+    cutoff = time.monotonic() - MEDIA_IN_USE_TTL
+    with lock:
+        for session_key in [key for key, (seen, _) in media_in_use.items() if seen < cutoff]:
+            del media_in_use[session_key]
+        keep = {path for _, paths in media_in_use.values() for path in paths if path}
+    get_youtube_downloader().prune_downloads(keep=keep.union(new_paths))
+
+# Background rendering so long ffmpeg encodes don't block the session
+@st.cache_resource
+def get_render_executor():
+    # Workers come from a forkserver, not a fork of this multithreaded server,
+    # so they can't inherit locks held by other threads
+    return ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context("forkserver"))
+
+def submit_render_job(fn, **kwargs):
+    """Submit a render to the shared pool, replacing the pool if a worker has died"""
+    # Arguments are pickled later on the executor's feeder thread; snapshot them
+    # now so edits to session state made meanwhile can't leak into the job
+    kwargs = copy.deepcopy(kwargs)
+    try:
+        return get_render_executor().submit(fn, **kwargs)
+    except BrokenProcessPool:
+        # A worker was killed (e.g. out of memory); the pool never recovers on its own
+        get_render_executor.clear()
+        return get_render_executor().submit(fn, **kwargs)
+
+def get_file_stamp(file_path):
+    """Modification time and size from a single stat, used as a cache key"""
+    stat_result = os.stat(file_path)
+    return stat_result.st_mtime_ns, stat_result.st_size
+
+# Cache media probes per file so reruns don't reopen the file
+@st.cache_data(show_spinner=False)
+def get_cached_video_info(video_path, stamp):
+    return get_video_processor().get_video_info(video_path)
+
+@st.cache_data(show_spinner=False)
+def get_cached_audio_info(audio_path, stamp):
+    return get_audio_handler().get_audio_info(audio_path)
+
+# Workspace listings walk the whole tree; a short TTL keeps new files appearing promptly
+@st.cache_data(show_spinner=False, ttl=10)
+def get_workspace_video_files():
+    return get_file_browser().get_video_files()
+
+@st.cache_data(show_spinner=False, ttl=10)
+def get_workspace_subtitle_files():
+    return get_file_browser().get_subtitle_files()
+
+@st.cache_data(show_spinner=False, ttl=10)
+def get_workspace_audio_files():
+    return get_file_browser().get_audio_files()
+
+# Cache subtitle parsing and shaping so unrelated widget changes don't redo them
+@st.cache_data(show_spinner=False, ttl=24 * 60 * 60)
+def get_cached_subtitles(subtitle_path, stamp, file_format):
+    return get_subtitle_renderer().parse_subtitle_file(subtitle_path, file_format=file_format)
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def get_shaped_texts(texts):
+    return tuple(get_arabic_processor().process_batch(list(texts)))
+
+def is_new_upload(kind, uploaded_file):
+    """Check whether the uploader holds a different file than the one already saved
+    
+    Args:
+        kind: Upload slot name ('video', 'subtitle' or 'audio')
+        uploaded_file: UploadedFile returned by st.file_uploader
+        
+    Returns:
+        True the first time a given upload is seen for this slot
+    """
+    upload_id = getattr(uploaded_file, 'file_id', None) or (uploaded_file.name, uploaded_file.size)
+    if st.session_state.upload_ids.get(kind) == upload_id:
+        return False
+    st.session_state.upload_ids[kind] = upload_id
+    return True
+
+def save_upload(uploaded_file, file_path):
+    """Stream an uploaded file to disk, hashing each chunk as it is written"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'wb') as out_file:
+        while chunk := uploaded_file.read(UPLOAD_CHUNK_SIZE):
+            out_file.write(chunk)
+            digest.update(chunk)
+    
+    # Content hash identifies the file for caches regardless of its temp path
+    st.session_state.file_hashes[str(file_path)] = digest.hexdigest()
+
+def build_youtube_options(info):
+    """Build the quality and subtitle dropdown maps once per fetched video
+    
+    Args:
+        info: Video information dictionary from YouTubeDownloader.get_video_info
+        
+    Returns:
+        tuple: (quality label -> format id, subtitle name -> (lang, subtitle type))
+    """
+    quality_options = {f"{fmt['quality']}": fmt['format_id'] for fmt in info['formats']}
+    
+    # Uploaded subtitles take precedence over automatic captions with the same name
+    sub_options = {sub['name']: (sub['lang'], 'subtitles') for sub in info.get('subtitles', [])}
+    for sub in info.get('automatic_captions', []):
+        sub_options.setdefault(sub['name'], (sub['lang'], 'automatic_captions'))
+    
+    return quality_options, sub_options
 
 # Main title
 st.title("🎬 أداة دمج الترجمة والصوت مع الفيديو")
@@ -79,14 +289,16 @@ with st.sidebar:
         if youtube_url and st.button("📥 جلب معلومات الفيديو", key="fetch_youtube_info"):
             try:
                 with st.spinner("جاري جلب معلومات الفيديو..."):
-                    video_info = processors['youtube'].get_video_info(youtube_url)
+                    video_info = get_youtube_downloader().get_video_info(youtube_url)
                     st.session_state.youtube_info = video_info
+                    st.session_state.youtube_options = build_youtube_options(video_info)
                     st.success(f"✅ {video_info['title']}")
             except Exception as e:
                 st.error(f"❌ {str(e)}")
         
         if 'youtube_info' in st.session_state and st.session_state.youtube_info:
             info = st.session_state.youtube_info
+            quality_options, sub_options = st.session_state.youtube_options
             
             st.write(f"**العنوان:** {info['title']}")
             st.write(f"**المدة:** {info['duration']//60} دقيقة {info['duration']%60} ثانية")
@@ -95,7 +307,6 @@ with st.sidebar:
             
             with col1:
                 if info['formats']:
-                    quality_options = {f"{fmt['quality']}": fmt['format_id'] for fmt in info['formats']}
                     selected_quality = st.selectbox(
                         "اختر الجودة",
                         list(quality_options.keys()),
@@ -106,20 +317,18 @@ with st.sidebar:
                         try:
                             with st.spinner("جاري تحميل الفيديو..."):
                                 format_id = quality_options[selected_quality]
-                                video_path = processors['youtube'].download_video(
+                                video_path = get_youtube_downloader().download_video(
                                     youtube_url,
                                     quality=format_id
                                 )
                                 st.session_state.video_file_path = video_path
+                                prune_youtube_downloads(video_path)
                                 st.success("✅ تم تحميل الفيديو بنجاح!")
-                                st.rerun()
                         except Exception as e:
                             st.error(f"❌ {str(e)}")
             
             with col2:
-                all_subs = info.get('subtitles', []) + info.get('automatic_captions', [])
-                if all_subs:
-                    sub_options = {sub['name']: (sub['lang'], 'subtitles' if sub in info.get('subtitles', []) else 'automatic_captions') for sub in all_subs}
+                if sub_options:
                     selected_sub = st.selectbox(
                         "اختر الترجمة",
                         list(sub_options.keys()),
@@ -130,23 +339,48 @@ with st.sidebar:
                         try:
                             with st.spinner("جاري تحميل الترجمة..."):
                                 lang, sub_type = sub_options[selected_sub]
-                                subtitle_path = processors['youtube'].download_subtitle(
+                                subtitle_path = get_youtube_downloader().download_subtitle(
                                     youtube_url,
                                     lang=lang,
                                     subtitle_type=sub_type
                                 )
                                 st.session_state.subtitle_file_path = subtitle_path
                                 st.session_state.subtitle_format = 'srt'
-                                st.session_state.subtitles_data = processors['subtitle'].parse_subtitle_file(
+                                st.session_state.subtitles_data = get_cached_subtitles(
                                     subtitle_path,
-                                    file_format='srt'
+                                    get_file_stamp(subtitle_path),
+                                    'srt'
                                 )
                                 st.success("✅ تم تحميل الترجمة بنجاح!")
-                                st.rerun()
                         except Exception as e:
                             st.error(f"❌ {str(e)}")
                 else:
                     st.info("لا توجد ترجمات متاحة")
+            
+            if info['formats'] and sub_options:
+                # One yt-dlp run fetches both files
+                if st.button("📥 تحميل الفيديو والترجمة معاً", key="download_youtube_both"):
+                    try:
+                        with st.spinner("جاري تحميل الفيديو والترجمة..."):
+                            lang, sub_type = sub_options[selected_sub]
+                            video_path, subtitle_path = get_youtube_downloader().download_video_with_subs(
+                                youtube_url,
+                                quality=quality_options[selected_quality],
+                                lang=lang,
+                                subtitle_type=sub_type
+                            )
+                            st.session_state.video_file_path = video_path
+                            st.session_state.subtitle_file_path = subtitle_path
+                            prune_youtube_downloads(video_path, subtitle_path)
+                            st.session_state.subtitle_format = 'srt'
+                            st.session_state.subtitles_data = get_cached_subtitles(
+                                subtitle_path,
+                                get_file_stamp(subtitle_path),
+                                'srt'
+                            )
+                            st.success("✅ تم تحميل الفيديو والترجمة بنجاح!")
+                    except Exception as e:
+                        st.error(f"❌ {str(e)}")
     
     st.markdown("---")
     
@@ -168,7 +402,7 @@ with st.sidebar:
             key="video_uploader"
         )
     else:
-        workspace_videos = processors['file_browser'].get_video_files()
+        workspace_videos = get_workspace_video_files()
         if workspace_videos:
             selected_video = st.selectbox(
                 "اختر ملف الفيديو من المساحة",
@@ -176,7 +410,7 @@ with st.sidebar:
                 key="workspace_video_select"
             )
             if selected_video:
-                video_file_path = processors['file_browser'].get_full_path(selected_video)
+                video_file_path = get_file_browser().get_full_path(selected_video)
                 if os.path.exists(video_file_path):
                     st.session_state.video_file_path = video_file_path
                     st.success(f"✅ تم اختيار: {selected_video}")
@@ -201,7 +435,7 @@ with st.sidebar:
             key="subtitle_uploader"
         )
     else:
-        workspace_subtitles = processors['file_browser'].get_subtitle_files()
+        workspace_subtitles = get_workspace_subtitle_files()
         if workspace_subtitles:
             selected_subtitle = st.selectbox(
                 "اختر ملف الترجمة من المساحة",
@@ -209,15 +443,19 @@ with st.sidebar:
                 key="workspace_subtitle_select"
             )
             if selected_subtitle:
-                subtitle_file_path = processors['file_browser'].get_full_path(selected_subtitle)
-                if os.path.exists(subtitle_file_path):
+                subtitle_file_path = get_file_browser().get_full_path(selected_subtitle)
+                # Parse only when the selection changes so editor changes survive reruns
+                if (subtitle_file_path != st.session_state.subtitle_file_path and
+                        os.path.exists(subtitle_file_path)):
                     st.session_state.subtitle_file_path = subtitle_file_path
                     file_ext = selected_subtitle.split('.')[-1].lower()
                     st.session_state.subtitle_format = file_ext
-                    st.session_state.subtitles_data = processors['subtitle'].parse_subtitle_file(
+                    st.session_state.subtitles_data = get_cached_subtitles(
                         subtitle_file_path,
-                        file_format=file_ext
+                        get_file_stamp(subtitle_file_path),
+                        file_ext
                     )
+                if st.session_state.subtitle_file_path == subtitle_file_path:
                     st.success(f"✅ تم اختيار: {selected_subtitle}")
         else:
             st.info("لا توجد ملفات ترجمة في المساحة")
@@ -240,7 +478,7 @@ with st.sidebar:
             key="audio_uploader"
         )
     else:
-        workspace_audio = processors['file_browser'].get_audio_files()
+        workspace_audio = get_workspace_audio_files()
         if workspace_audio:
             selected_audio = st.selectbox(
                 "اختر ملف الصوت من المساحة",
@@ -248,22 +486,35 @@ with st.sidebar:
                 key="workspace_audio_select"
             )
             if selected_audio:
-                audio_file_path = processors['file_browser'].get_full_path(selected_audio)
+                audio_file_path = get_file_browser().get_full_path(selected_audio)
                 if os.path.exists(audio_file_path):
                     st.session_state.audio_file_path = audio_file_path
                     st.success(f"✅ تم اختيار: {selected_audio}")
         else:
             st.info("لا توجد ملفات صوت في المساحة")
+    
+    st.markdown("---")
+    
+    # Encoder for previews and export
+    st.checkbox(
+        "⚡ استخدام تسريع العتاد في المعاينة والتصدير",
+        value=True,
+        key="use_hardware_accel",
+        help="يستخدم مرمّز الفيديو في كرت الشاشة (NVENC / QSV / VAAPI) إن توفر"
+    )
 
-# Handle file uploads
-if video_file:
-    with tempfile.NamedTemporaryFile(delete=False, suffix=f'.{video_file.name.split(".")[-1]}') as tmp_video:
-        tmp_video.write(video_file.read())
-        st.session_state.video_file_path = tmp_video.name
+# Handle file uploads (the uploader re-yields the same file on every rerun)
+if video_file and is_new_upload('video', video_file):
+    tmp_video_path = Path(st.session_state.tmpdir.name) / f'video.{video_file.name.split(".")[-1]}'
+    save_upload(video_file, tmp_video_path)
+    st.session_state.video_file_path = str(tmp_video_path)
+    # Only the saved copy is used from here on
+    del video_file
 
 # Display video info if video is selected (from upload or workspace)
 if st.session_state.video_file_path and os.path.exists(st.session_state.video_file_path):
-    video_info = processors['video'].get_video_info(st.session_state.video_file_path)
+    video_path = st.session_state.video_file_path
+    video_info = get_cached_video_info(video_path, get_file_stamp(video_path))
     with st.expander("معلومات الفيديو"):
         col1, col2 = st.columns(2)
         with col1:
@@ -273,292 +524,344 @@ if st.session_state.video_file_path and os.path.exists(st.session_state.video_fi
             st.write(f"**الدقة:** {video_info['width']}x{video_info['height']}")
             st.write(f"**حجم الملف:** {video_info['size']:.2f} MB")
 
-if subtitle_file:
+if subtitle_file and is_new_upload('subtitle', subtitle_file):
     # Get file extension
     file_ext = subtitle_file.name.split('.')[-1].lower()
     
-    with tempfile.NamedTemporaryFile(delete=False, suffix=f'.{file_ext}', mode='w', encoding='utf-8') as tmp_sub:
-        content = subtitle_file.read().decode('utf-8')
-        tmp_sub.write(content)
-        st.session_state.subtitle_file_path = tmp_sub.name
-        st.session_state.subtitle_format = file_ext
+    tmp_sub_path = Path(st.session_state.tmpdir.name) / f'subtitle.{file_ext}'
+    with open(tmp_sub_path, 'w', encoding='utf-8') as tmp_sub:
+        subtitle_text = io.TextIOWrapper(subtitle_file, encoding='utf-8')
+        shutil.copyfileobj(subtitle_text, tmp_sub, UPLOAD_CHUNK_SIZE)
+        subtitle_text.detach()  # Keep the uploaded buffer open for Streamlit
+    st.session_state.subtitle_file_path = str(tmp_sub_path)
+    st.session_state.subtitle_format = file_ext
     
     # Parse subtitles based on format
-    st.session_state.subtitles_data = processors['subtitle'].parse_subtitle_file(
+    st.session_state.subtitles_data = get_cached_subtitles(
         st.session_state.subtitle_file_path,
-        file_format=file_ext
+        get_file_stamp(st.session_state.subtitle_file_path),
+        file_ext
     )
     st.success(f"✅ تم تحميل ملف الترجمة {file_ext.upper()} ({len(st.session_state.subtitles_data)} ترجمة)")
 
-if audio_file:
-    with tempfile.NamedTemporaryFile(delete=False, suffix=f'.{audio_file.name.split(".")[-1]}') as tmp_audio:
-        tmp_audio.write(audio_file.read())
-        st.session_state.audio_file_path = tmp_audio.name
+if audio_file and is_new_upload('audio', audio_file):
+    tmp_audio_path = Path(st.session_state.tmpdir.name) / f'audio.{audio_file.name.split(".")[-1]}'
+    save_upload(audio_file, tmp_audio_path)
+    st.session_state.audio_file_path = str(tmp_audio_path)
+    del audio_file
 
 # Display audio info if audio is selected (from upload or workspace)
 if st.session_state.audio_file_path and os.path.exists(st.session_state.audio_file_path):
-    audio_info = processors['audio'].get_audio_info(st.session_state.audio_file_path)
+    audio_path = st.session_state.audio_file_path
+    audio_info = get_cached_audio_info(audio_path, get_file_stamp(audio_path))
     with st.expander("معلومات الصوت"):
         st.write(f"**المدة:** {audio_info['duration']:.2f} ثانية")
         st.write(f"**معدل العينات:** {audio_info['sample_rate']} Hz")
         st.write(f"**عدد القنوات:** {audio_info['channels']}")
 
-# Main content area
-if st.session_state.video_file_path and st.session_state.subtitle_file_path:
+@st.fragment(run_every=1)
+def wait_for_job(job_key, label):
+    """Show progress for a pending background job, polling it every second until it finishes"""
+    job = st.session_state.get(job_key)
+    if job is None or job.done():
+        # Full rerun so the owning section collects the result
+        st.rerun()
+    with st.status(label, state="running"):
+        st.write("يمكنك متابعة تعديل الإعدادات أثناء المعالجة")
+
+def drop_page_cache(file_path):
+    """Tell the kernel the file's cached pages are no longer needed (Linux only)"""
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    fd = os.open(file_path, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+def get_file_identity(file_path):
+    """Content hash for uploads, path, modification time and size otherwise"""
+    return st.session_state.file_hashes.get(file_path) or [file_path, *get_file_stamp(file_path)]
+
+def get_preview_key():
+    """Fingerprint everything that affects the rendered preview"""
+    video_path = st.session_state.video_file_path
+    audio_path = st.session_state.audio_file_path
+    payload = json.dumps({
+        'settings': st.session_state.subtitle_settings,
+        'subtitles': st.session_state.subtitles_data,
+        'quick': st.session_state.get('quick_preview', False),
+        'video': get_file_identity(video_path),
+        'audio': get_file_identity(audio_path) if audio_path and os.path.exists(audio_path) else None
+    }, sort_keys=True)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+
+def remember_preview(preview_key, preview_path):
+    """Add a rendered preview to the cache, deleting the oldest one beyond the limit"""
+    preview_cache = st.session_state.preview_cache
+    preview_cache[preview_key] = preview_path
+    while len(preview_cache) > PREVIEW_CACHE_SIZE:
+        stale_path = preview_cache.pop(next(iter(preview_cache)))
+        for path in (stale_path, os.path.splitext(stale_path)[0] + '.vtt'):
+            if os.path.exists(path):
+                os.unlink(path)
+
+@st.fragment
+def render_preview_section():
+    st.header("معاينة الفيديو")
     
-    # Tabs for different sections
-    tab1, tab2, tab3, tab4 = st.tabs(["⚙️ إعدادات التحكم", "✏️ تحرير الترجمة", "👀 معاينة الفيديو", "💾 التصدير والحفظ"])
+    quick_preview = st.checkbox(
+        "⚡ معاينة سريعة",
+        key="quick_preview",
+        help="تنسخ الفيديو دون إعادة ترميز وتعرض الترجمة كمسار نصي في المتصفح، دون تنسيق الخط والألوان"
+    )
     
-    with tab1:
-        st.header("إعدادات التحكم في الترجمة والصوت")
+    if st.button("🔄 تحديث المعاينة", type="primary", disabled='preview_job' in st.session_state):
+        preview_key = get_preview_key()
+        cached_preview = st.session_state.preview_cache.get(preview_key)
         
-        # Initialize settings keys with professional defaults (like movie subtitles)
-        if 'setting_font_family' not in st.session_state:
-            st.session_state.setting_font_family = "Noto Sans Arabic"
-        if 'setting_font_size' not in st.session_state:
-            st.session_state.setting_font_size = 42
-        if 'setting_text_color' not in st.session_state:
-            st.session_state.setting_text_color = "#FFFFFF"
-        if 'setting_bg_color' not in st.session_state:
-            st.session_state.setting_bg_color = "#000000"
-        if 'setting_stroke_width' not in st.session_state:
-            st.session_state.setting_stroke_width = 3
-        if 'setting_stroke_color' not in st.session_state:
-            st.session_state.setting_stroke_color = "#000000"
-        if 'setting_bg_opacity' not in st.session_state:
-            st.session_state.setting_bg_opacity = 0.0
-        if 'setting_shadow_enabled' not in st.session_state:
-            st.session_state.setting_shadow_enabled = True
-        if 'setting_shadow_offset_x' not in st.session_state:
-            st.session_state.setting_shadow_offset_x = 3
-        if 'setting_shadow_offset_y' not in st.session_state:
-            st.session_state.setting_shadow_offset_y = 3
-        if 'setting_shadow_blur' not in st.session_state:
-            st.session_state.setting_shadow_blur = 5
-        if 'setting_text_wrap_width' not in st.session_state:
-            st.session_state.setting_text_wrap_width = 45
+        if cached_preview and os.path.exists(cached_preview):
+            # Nothing changed since this preview was rendered; mark it most recent
+            remember_preview(preview_key, st.session_state.preview_cache.pop(preview_key))
+            st.session_state.processed_video_path = cached_preview
+            st.session_state.preview_ready = True
+            st.rerun()
+        else:
+            # Create preview with current settings
+            st.session_state.preview_key = preview_key
+            video_processor = get_video_processor()
+            if quick_preview:
+                create_preview, preview_options = video_processor.create_quick_preview, {}
+            else:
+                create_preview = video_processor.create_preview
+                preview_options = {'use_hardware': st.session_state.use_hardware_accel}
+            st.session_state.preview_job = submit_render_job(
+                create_preview,
+                video_path=st.session_state.video_file_path,
+                subtitles_data=st.session_state.subtitles_data,
+                audio_path=st.session_state.audio_file_path,
+                settings=st.session_state.subtitle_settings,
+                arabic_processor=get_arabic_processor(),
+                subtitle_renderer=get_subtitle_renderer(),
+                output_dir=st.session_state.tmpdir.name,
+                **preview_options
+            )
+    
+    if 'preview_job' in st.session_state and not st.session_state.preview_job.done():
+        wait_for_job('preview_job', "جاري إنشاء المعاينة...")
+    elif 'preview_job' in st.session_state:
+        job = st.session_state.pop('preview_job')
+        try:
+            st.session_state.processed_video_path = job.result()
+            remember_preview(st.session_state.preview_key, st.session_state.processed_video_path)
+            st.session_state.preview_ready = True
+        except BrokenProcessPool:
+            get_render_executor.clear()
+            st.error(f"❌ {RENDER_WORKER_DIED}")
+        except Exception as e:
+            st.error(f"❌ خطأ في إنشاء المعاينة: {str(e)}")
+        else:
+            # Full rerun so the export tab sees the new preview
+            st.rerun()
+    
+    if st.session_state.preview_ready and st.session_state.processed_video_path:
+        st.subheader("المعاينة المباشرة")
         
-        col1, col2 = st.columns(2)
+        # Display the processed video with full width. Streamlit reads the file
+        # into its in-memory media storage and serves it by URL, which avoids
+        # a base64 data URI in the page; quick previews carry their subtitles
+        # as a separate text track
+        preview_track = os.path.splitext(st.session_state.processed_video_path)[0] + '.vtt'
+        st.video(
+            st.session_state.processed_video_path,
+            autoplay=True,
+            subtitles=preview_track if os.path.exists(preview_track) else None
+        )
         
-        with col1:
-            st.subheader("🎨 تنسيق النص")
-            
-            # Font settings with keys
-            font_options = ["Arial", "Noto Sans Arabic", "Amiri", "Cairo", "Tajawal"]
-            font_family = st.selectbox(
-                "نوع الخط",
-                font_options,
-                key='setting_font_family'
-            )
+        # Sample subtitles preview in a separate section
+        if st.session_state.subtitles_data:
+            st.markdown("---")
+            st.subheader("عينة من الترجمات")
+            sample_subs = st.session_state.subtitles_data[:5]  # Show first 5
+            shaped_texts = get_shaped_texts(tuple(sub['text'] for sub in sample_subs))
+            sample_lines = [f"**{sub['start']} → {sub['end']}:** {processed_text}"
+                            for sub, processed_text in zip(sample_subs, shaped_texts)]
             
-            font_size = st.slider("حجم الخط", 12, 72, key='setting_font_size', help="اضبط حجم النص - قيم أكبر للنص الأوضح")
+            if len(st.session_state.subtitles_data) > 5:
+                sample_lines.append(f"... و {len(st.session_state.subtitles_data) - 5} ترجمة أخرى")
             
-            text_wrap_width = st.slider(
-                "عرض النص (حروف في السطر)", 
-                20, 80, 
-                key='setting_text_wrap_width',
-                help="قلل القيمة لنص أقصر وأكثر وضوحاً، أو زدها لنص أطول"
+            # One markdown element for the whole sample instead of one per line
+            st.markdown("  \n".join(sample_lines))
+
+@st.fragment
+def render_export_section():
+    st.header("تصدير وحفظ الفيديو النهائي")
+    
+    if not st.session_state.preview_ready:
+        st.warning("⚠️ يرجى إنشاء المعاينة أولاً من تبويب المعاينة")
+    else:
+        st.subheader("إعدادات التصدير")
+        
+        col1, col2, col3 = st.columns(3)
+        
+        with col1:
+            output_quality = st.selectbox(
+                "جودة الفيديو",
+                ["عالية جداً (أبطأ)", "عالية", "متوسطة", "سريعة"],
+                index=1
             )
-            
-            # Colors
-            text_color = st.color_picker("لون النص", key='setting_text_color')
-            bg_color = st.color_picker("لون الخلفية", key='setting_bg_color')
-            
-            # Stroke/Border
-            stroke_width = st.slider("سمك الحدود", 0, 5, key='setting_stroke_width')
-            stroke_color = st.color_picker("لون الحدود", key='setting_stroke_color')
-            
-            # Background opacity
-            bg_opacity = st.slider("شفافية الخلفية", 0.0, 1.0, key='setting_bg_opacity')
-            
-            # Text effects
-            st.subheader("🌟 تأثيرات النص")
-            enable_shadow = st.checkbox("تفعيل الظل", key='setting_shadow_enabled')
-            if enable_shadow:
-                shadow_offset_x = st.slider("إزاحة الظل أفقياً", -10, 10, key='setting_shadow_offset_x')
-                shadow_offset_y = st.slider("إزاحة الظل عمودياً", -10, 10, key='setting_shadow_offset_y')
-                shadow_blur = st.slider("ضبابية الظل", 0, 10, key='setting_shadow_blur')
-            else:
-                shadow_offset_x = 0
-                shadow_offset_y = 0
-                shadow_blur = 0
-            
-            st.markdown("---")
-            st.info("💡 الإعدادات الافتراضية محسّنة بجودة احترافية")
-            
-        # Initialize position settings with professional defaults
-        if 'setting_position' not in st.session_state:
-            st.session_state.setting_position = "أسفل"
-        if 'setting_alignment' not in st.session_state:
-            st.session_state.setting_alignment = "وسط"
-        if 'setting_margin_horizontal' not in st.session_state:
-            st.session_state.setting_margin_horizontal = 50
-        if 'setting_margin_vertical' not in st.session_state:
-            st.session_state.setting_margin_vertical = 60
-        if 'setting_subtitle_offset' not in st.session_state:
-            st.session_state.setting_subtitle_offset = 0.0
-        if 'setting_audio_offset' not in st.session_state:
-            st.session_state.setting_audio_offset = 0.0
-        if 'setting_audio_volume' not in st.session_state:
-            st.session_state.setting_audio_volume = 1.0
         
         with col2:
-            st.subheader("📍 موضع النص")
+            # Get original video resolution
+            video_path = st.session_state.video_file_path
+            video_info = get_cached_video_info(video_path, get_file_stamp(video_path))
+            original_height = video_info['height']
             
-            # Position
-            position_options = ["أسفل", "وسط", "أعلى"]
-            position = st.selectbox(
-                "موقع الترجمة",
-                position_options,
-                key='setting_position'
-            )
+            # Resolution options
+            resolution_options = ["الدقة الأصلية", "4K (2160p)", "1080p", "720p", "480p"]
+            resolution_index = 0
             
-            # Alignment
-            alignment_options = ["يمين", "وسط", "يسار"]
-            alignment = st.selectbox(
-                "محاذاة النص",
-                alignment_options,
-                key='setting_alignment'
+            output_resolution = st.selectbox(
+                "دقة الفيديو",
+                resolution_options,
+                index=resolution_index,
+                help="اختر دقة الفيديو النهائي"
             )
             
-            # Margins
-            margin_horizontal = st.slider("الهامش الأفقي", 10, 100, key='setting_margin_horizontal')
-            margin_vertical = st.slider("الهامش العمودي", 10, 100, key='setting_margin_vertical')
-        
-        st.subheader("⏱️ ضبط التوقيت")
-        
-        col3, col4 = st.columns(2)
-        
         with col3:
-            subtitle_offset = st.number_input(
-                "تعديل توقيت الترجمة (بالثواني)",
-                min_value=-30.0,
-                max_value=30.0,
-                step=0.1,
-                help="قيمة موجبة للتأخير، قيمة سالبة للتقديم",
-                key='setting_subtitle_offset'
+            output_filename = st.text_input(
+                "اسم الملف النهائي",
+                value="video_with_subtitles",
+                help="بدون امتداد الملف"
             )
-            
-        with col4:
-            if st.session_state.audio_file_path:
-                audio_offset = st.number_input(
-                    "تعديل توقيت الصوت (بالثواني)",
-                    min_value=-30.0,
-                    max_value=30.0,
-                    step=0.1,
-                    help="قيمة موجبة للتأخير، قيمة سالبة للتقديم",
-                    key='setting_audio_offset'
-                )
-                
-                audio_volume = st.slider("مستوى الصوت", 0.0, 2.0, 0.1, key='setting_audio_volume')
-            else:
-                audio_offset = 0.0
-                audio_volume = 1.0
         
-        # Store settings in session state
-        st.session_state.subtitle_settings = {
-            'font_family': font_family,
-            'font_size': font_size,
-            'text_color': text_color,
-            'bg_color': bg_color,
-            'stroke_width': stroke_width,
-            'stroke_color': stroke_color,
-            'bg_opacity': bg_opacity,
-            'position': position,
-            'alignment': alignment,
-            'margin_horizontal': margin_horizontal,
-            'margin_vertical': margin_vertical,
-            'subtitle_offset': subtitle_offset,
-            'audio_offset': audio_offset,
-            'audio_volume': audio_volume,
-            'shadow_enabled': enable_shadow,
-            'shadow_offset_x': shadow_offset_x,
-            'shadow_offset_y': shadow_offset_y,
-            'shadow_blur': shadow_blur,
-            'text_wrap_width': text_wrap_width
-        }
-        
-        # Settings save/load section
-        st.markdown("---")
-        st.subheader("💾 حفظ وتحميل الإعدادات")
-        
-        col1, col2 = st.columns(2)
+        if st.button("🚀 تصدير الفيديو النهائي", type="primary", disabled='export_job' in st.session_state):
+            # Quality settings mapping
+            quality_settings = {
+                "عالية جداً (أبطأ)": {"preset": "slow", "crf": 18, "cq": 19},
+                "عالية": {"preset": "medium", "crf": 23, "cq": 23},
+                "متوسطة": {"preset": "fast", "crf": 28, "cq": 28},
+                "سريعة": {"preset": "veryfast", "crf": 32, "cq": 32}
+            }
+            
+            # Resolution mapping
+            resolution_mapping = {
+                "الدقة الأصلية": None,
+                "4K (2160p)": 2160,
+                "1080p": 1080,
+                "720p": 720,
+                "480p": 480
+            }
+            
+            settings = quality_settings[output_quality]
+            target_height = resolution_mapping[output_resolution]
+            
+            st.session_state.export_filename = output_filename
+            st.session_state.export_job = submit_render_job(
+                get_video_processor().export_final_video,
+                video_path=st.session_state.video_file_path,
+                subtitles_data=st.session_state.subtitles_data,
+                audio_path=st.session_state.audio_file_path,
+                settings=st.session_state.subtitle_settings,
+                arabic_processor=get_arabic_processor(),
+                subtitle_renderer=get_subtitle_renderer(),
+                output_filename=output_filename,
+                quality_settings=settings,
+                target_resolution=target_height,
+                use_hardware=st.session_state.use_hardware_accel
+            )
         
-        with col1:
-            preset_name = st.text_input("اسم المجموعة", value="my_preset", help="اسم لحفظ الإعدادات الحالية")
-            if st.button("💾 حفظ الإعدادات الحالية"):
-                # Save settings to JSON file
-                import json
-                presets_file = "subtitle_presets.json"
-                
-                # Load existing presets
-                if os.path.exists(presets_file):
-                    with open(presets_file, 'r', encoding='utf-8') as f:
-                        presets = json.load(f)
-                else:
-                    presets = {}
-                
-                # Add current settings
-                presets[preset_name] = st.session_state.subtitle_settings
-                
-                # Save back to file
-                with open(presets_file, 'w', encoding='utf-8') as f:
-                    json.dump(presets, f, ensure_ascii=False, indent=2)
-                
-                st.success(f"✅ تم حفظ الإعدادات باسم '{preset_name}'")
+        if 'export_job' in st.session_state and not st.session_state.export_job.done():
+            wait_for_job('export_job', "جاري تصدير الفيديو النهائي... هذا قد يستغرق بعض الوقت")
+        elif 'export_job' in st.session_state:
+            job = st.session_state.pop('export_job')
+            try:
+                st.session_state.final_video_path = job.result()
+                st.session_state.pop('export_payload', None)
+                st.success("✅ تم تصدير الفيديو بنجاح!")
+            except BrokenProcessPool:
+                get_render_executor.clear()
+                st.error(f"❌ {RENDER_WORKER_DIED}")
+            except Exception as e:
+                st.error(f"❌ خطأ في التصدير: {str(e)}")
         
-        with col2:
-            # Load presets
-            presets_file = "subtitle_presets.json"
-            if os.path.exists(presets_file):
-                with open(presets_file, 'r', encoding='utf-8') as f:
-                    presets = json.load(f)
-                
-                if presets:
-                    selected_preset = st.selectbox("اختر إعدادات محفوظة", list(presets.keys()))
-                    if st.button("📥 تحميل الإعدادات"):
-                        st.info(f"💡 لتحميل الإعدادات '{selected_preset}'، يرجى نسخ القيم يدوياً من الملف subtitle_presets.json")
-                else:
-                    st.info("لا توجد إعدادات محفوظة بعد")
-            else:
-                st.info("لا توجد إعدادات محفوظة بعد")
+        final_video_path = st.session_state.get('final_video_path')
+        if final_video_path and os.path.exists(final_video_path):
+            # Show file info from the stat alone, before any bytes are read
+            file_size = os.path.getsize(final_video_path) / (1024 * 1024)  # MB
+            st.info(f"حجم الملف النهائي: {file_size:.2f} MB")
+            
+            # The file is read into memory only on request, once per export, and
+            # released after the download so later reruns don't touch it
+            payload_key = (final_video_path, *get_file_stamp(final_video_path))
+            payload = st.session_state.get('export_payload')
+            if not payload or payload[0] != payload_key:
+                payload = None
+                if st.button("📦 تجهيز ملف التحميل", key="prepare_export_download"):
+                    with open(final_video_path, 'rb') as final_fh:
+                        payload = (payload_key, final_fh.read())
+                    st.session_state.export_payload = payload
+                    # The bytes are handed off to memory; the file's cached pages aren't needed
+                    drop_page_cache(final_video_path)
+            
+            if payload:
+                st.download_button(
+                    label="📥 تحميل الفيديو النهائي",
+                    data=payload[1],
+                    file_name=f"{st.session_state.export_filename}.mp4",
+                    mime="video/mp4",
+                    on_click=release_export_payload
+                )
+
+def release_export_payload():
+    """Free the in-memory export copy once the download has been handed out"""
+    st.session_state.pop('export_payload', None)
+
+def get_search_index():
+    """Lowercased subtitle texts, rebuilt only when the subtitle list is replaced"""
+    subtitles = st.session_state.subtitles_data
+    # Keep the list itself, not its id(): a freed list's id can be reused by a new one
+    if st.session_state.get('search_index_source') is not subtitles:
+        st.session_state.search_index = [sub['text'].lower() for sub in subtitles]
+        st.session_state.search_index_source = subtitles
+    return st.session_state.search_index
+
+@st.fragment
+def render_subtitle_editor():
+    st.header("تحرير الترجمة")
     
-    with tab2:
-        st.header("تحرير الترجمة")
-        
-        st.markdown("يمكنك تعديل نص الترجمات أو توقيتها مباشرة من هنا")
-        
-        # Search/filter functionality
-        col1, col2 = st.columns([3, 1])
-        with col1:
-            search_term = st.text_input("🔍 بحث في الترجمات", placeholder="ابحث عن نص معين...")
-        with col2:
-            items_per_page = st.selectbox("عدد الترجمات", [5, 10, 20, 50], index=1)
-        
-        # Filter subtitles based on search
-        filtered_subs = st.session_state.subtitles_data
-        if search_term:
-            filtered_subs = [sub for sub in st.session_state.subtitles_data 
-                           if search_term.lower() in sub['text'].lower()]
-        
-        st.write(f"عدد الترجمات: {len(filtered_subs)} من أصل {len(st.session_state.subtitles_data)}")
-        
-        # Pagination
-        total_pages = (len(filtered_subs) - 1) // items_per_page + 1
-        page = st.number_input("الصفحة", min_value=1, max_value=max(1, total_pages), value=1, step=1)
-        
-        start_idx = (page - 1) * items_per_page
-        end_idx = min(start_idx + items_per_page, len(filtered_subs))
-        
-        # Display subtitle editor
-        st.markdown("---")
-        
-        # Track if any changes were made
-        changes_made = False
-        
-        for i in range(start_idx, end_idx):
-            sub = filtered_subs[i]
-            original_idx = st.session_state.subtitles_data.index(sub)
+    st.markdown("يمكنك تعديل نص الترجمات أو توقيتها مباشرة من هنا")
+    
+    # Search/filter functionality
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        search_term = st.text_input("🔍 بحث في الترجمات", placeholder="ابحث عن نص معين...")
+    with col2:
+        items_per_page = st.selectbox("عدد الترجمات", [5, 10, 20, 50], index=1)
+    
+    # Filter subtitles based on search, keeping each one's position in the full list
+    filtered_subs = list(enumerate(st.session_state.subtitles_data))
+    if search_term:
+        query = search_term.lower()
+        filtered_subs = [filtered_subs[idx] for idx, text in enumerate(get_search_index())
+                       if query in text]
+    
+    st.write(f"عدد الترجمات: {len(filtered_subs)} من أصل {len(st.session_state.subtitles_data)}")
+    
+    # Pagination
+    total_pages = (len(filtered_subs) - 1) // items_per_page + 1
+    page = st.number_input("الصفحة", min_value=1, max_value=max(1, total_pages), value=1, step=1)
+    
+    start_idx = (page - 1) * items_per_page
+    end_idx = min(start_idx + items_per_page, len(filtered_subs))
+    
+    # Display subtitle editor
+    st.markdown("---")
+    
+    # Edits on the page are collected in a form and applied together on submit
+    with st.form(f"edit_page_{page}"):
+        edits = {}
+        for original_idx, sub in filtered_subs[start_idx:end_idx]:
             
             with st.expander(f"الترجمة #{sub['index']}: {sub['start']:.2f}s - {sub['end']:.2f}s"):
                 col1, col2, col3 = st.columns([2, 1, 1])
@@ -588,217 +891,249 @@ if st.session_state.video_file_path and st.session_state.subtitle_file_path:
                         format="%.2f",
                         key=f"end_{original_idx}"
                     )
-                
-                # Update subtitle if changed
-                if (new_text != sub['text'] or 
-                    new_start != sub['start'] or 
-                    new_end != sub['end']):
-                    
-                    if st.button("💾 حفظ التغييرات", key=f"save_{original_idx}"):
-                        st.session_state.subtitles_data[original_idx]['text'] = new_text
-                        st.session_state.subtitles_data[original_idx]['start'] = new_start
-                        st.session_state.subtitles_data[original_idx]['end'] = new_end
-                        st.success(f"✅ تم حفظ التغييرات للترجمة #{sub['index']}")
-                        changes_made = True
-                        st.rerun()
-        
-        if changes_made:
-            st.info("💡 لا تنسَ تحديث المعاينة لمشاهدة التغييرات!")
-        
-        st.markdown("---")
-        
-        # Bulk operations
-        st.subheader("عمليات جماعية")
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            if st.button("🔄 إعادة تعيين جميع التغييرات"):
-                # Re-parse from original file
-                file_format = st.session_state.get('subtitle_format', 'srt')
-                st.session_state.subtitles_data = processors['subtitle'].parse_subtitle_file(
-                    st.session_state.subtitle_file_path,
-                    file_format=file_format
-                )
-                st.success("✅ تم إعادة تحميل الترجمات الأصلية")
-                st.rerun()
+            
+            edits[original_idx] = (new_text, new_start, new_end)
         
-        with col2:
-            # Export edited subtitles
-            if st.button("📥 تصدير الترجمات المعدلة (SRT)"):
-                # Create SRT content from edited subtitles
-                srt_content = ""
-                for idx, sub in enumerate(st.session_state.subtitles_data, 1):
-                    start_h = int(sub['start'] // 3600)
-                    start_m = int((sub['start'] % 3600) // 60)
-                    start_s = int(sub['start'] % 60)
-                    start_ms = int((sub['start'] % 1) * 1000)
-                    
-                    end_h = int(sub['end'] // 3600)
-                    end_m = int((sub['end'] % 3600) // 60)
-                    end_s = int(sub['end'] % 60)
-                    end_ms = int((sub['end'] % 1) * 1000)
-                    
-                    srt_content += f"{idx}\n"
-                    srt_content += f"{start_h:02d}:{start_m:02d}:{start_s:02d},{start_ms:03d} --> "
-                    srt_content += f"{end_h:02d}:{end_m:02d}:{end_s:02d},{end_ms:03d}\n"
-                    srt_content += f"{sub['text']}\n\n"
-                
-                st.download_button(
-                    label="📥 تحميل ملف SRT",
-                    data=srt_content.encode('utf-8'),
-                    file_name="edited_subtitles.srt",
-                    mime="text/plain"
-                )
+        save_clicked = st.form_submit_button("💾 حفظ التغييرات")
     
-    with tab3:
-        st.header("معاينة الفيديو")
-        
-        if st.button("🔄 تحديث المعاينة", type="primary"):
-            with st.spinner("جاري إنشاء المعاينة..."):
-                try:
-                    # Create preview with current settings
-                    preview_path = processors['video'].create_preview(
-                        video_path=st.session_state.video_file_path,
-                        subtitles_data=st.session_state.subtitles_data,
-                        audio_path=st.session_state.audio_file_path,
-                        settings=st.session_state.subtitle_settings,
-                        arabic_processor=processors['arabic_text'],
-                        subtitle_renderer=processors['subtitle']
-                    )
-                    
-                    st.session_state.processed_video_path = preview_path
-                    st.session_state.preview_ready = True
-                    st.success("✅ تم إنشاء المعاينة بنجاح!")
-                    
-                except Exception as e:
-                    st.error(f"❌ خطأ في إنشاء المعاينة: {str(e)}")
+    if save_clicked:
+        # Apply only the rows that actually changed
+        changed = 0
+        for original_idx, (new_text, new_start, new_end) in edits.items():
+            sub = st.session_state.subtitles_data[original_idx]
+            if (new_text != sub['text'] or 
+                new_start != sub['start'] or 
+                new_end != sub['end']):
+                sub['text'] = new_text
+                sub['start'] = new_start
+                sub['end'] = new_end
+                get_search_index()[original_idx] = new_text.lower()
+                changed += 1
         
-        if st.session_state.preview_ready and st.session_state.processed_video_path:
-            st.subheader("المعاينة المباشرة")
-            
-            # Display the processed video with full width
-            with open(st.session_state.processed_video_path, 'rb') as video_file:
-                video_bytes = video_file.read()
-            
-            # Use HTML video player for better control
-            import base64
-            video_base64 = base64.b64encode(video_bytes).decode()
+        if changed:
+            st.session_state.editor_saved_count = changed
+            st.rerun(scope="fragment")
+    
+    saved_count = st.session_state.pop('editor_saved_count', 0)
+    if saved_count:
+        st.success(f"✅ تم حفظ التغييرات لـ {saved_count} ترجمة")
+        st.info("💡 لا تنسَ تحديث المعاينة لمشاهدة التغييرات!")
+    
+    st.markdown("---")
+    
+    # Bulk operations
+    st.subheader("عمليات جماعية")
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        if st.button("🔄 إعادة تعيين جميع التغييرات"):
+            # Re-parse from original file
+            file_format = st.session_state.get('subtitle_format', 'srt')
+            st.session_state.subtitles_data = get_cached_subtitles(
+                st.session_state.subtitle_file_path,
+                get_file_stamp(st.session_state.subtitle_file_path),
+                file_format
+            )
+            st.success("✅ تم إعادة تحميل الترجمات الأصلية")
+            st.rerun(scope="fragment")
+    
+    with col2:
+        # Export edited subtitles
+        if st.button("📥 تصدير الترجمات المعدلة (SRT)"):
+            from utils.subtitle_renderer import format_srt_time
             
-            video_html = f"""
-            <div style="width: 100%; max-width: 100%; margin: 0 auto; overflow: visible;">
-                <video controls style="width: 100%; height: auto; max-width: 100%; object-fit: contain; display: block;" autoplay>
-                    <source src="data:video/mp4;base64,{video_base64}" type="video/mp4">
-                    المتصفح لا يدعم تشغيل الفيديو
-                </video>
-            </div>
-            """
-            st.markdown(video_html, unsafe_allow_html=True)
+            # Create SRT content from edited subtitles
+            srt_content = "\n".join(
+                f"{idx}\n{format_srt_time(sub['start'])} --> {format_srt_time(sub['end'])}\n{sub['text']}\n"
+                for idx, sub in enumerate(st.session_state.subtitles_data, 1)
+            ) + "\n"
             
-            # Sample subtitles preview in a separate section
-            if st.session_state.subtitles_data:
-                st.markdown("---")
-                st.subheader("عينة من الترجمات")
-                for i, sub in enumerate(st.session_state.subtitles_data[:5]):  # Show first 5
-                    processed_text = processors['arabic_text'].process_text(sub['text'])
-                    st.markdown(f"**{sub['start']} → {sub['end']}:** {processed_text}")
-                
-                if len(st.session_state.subtitles_data) > 5:
-                    st.markdown(f"... و {len(st.session_state.subtitles_data) - 5} ترجمة أخرى")
+            st.download_button(
+                label="📥 تحميل ملف SRT",
+                data=srt_content.encode('utf-8'),
+                file_name="edited_subtitles.srt",
+                mime="text/plain"
+            )
+
+# Main content area
+if st.session_state.video_file_path and st.session_state.subtitle_file_path:
     
-    with tab4:
-        st.header("تصدير وحفظ الفيديو النهائي")
+    # Tabs for different sections
+    tab1, tab2, tab3, tab4 = st.tabs(["⚙️ إعدادات التحكم", "✏️ تحرير الترجمة", "👀 معاينة الفيديو", "💾 التصدير والحفظ"])
+    
+    with tab1:
+        st.header("إعدادات التحكم في الترجمة والصوت")
         
-        if not st.session_state.preview_ready:
-            st.warning("⚠️ يرجى إنشاء المعاينة أولاً من تبويب المعاينة")
-        else:
-            st.subheader("إعدادات التصدير")
-            
-            col1, col2, col3 = st.columns(3)
+        # Initialize settings keys with professional defaults (like movie subtitles)
+        for key, value in DEFAULT_SETTINGS.items():
+            st.session_state.setdefault(key, value)
+        
+        # Widgets inside the form only rerun the script when it is submitted
+        with st.form("subtitle_settings_form"):
+            col1, col2 = st.columns(2)
             
             with col1:
-                output_quality = st.selectbox(
-                    "جودة الفيديو",
-                    ["عالية جداً (أبطأ)", "عالية", "متوسطة", "سريعة"],
-                    index=1
+                st.subheader("🎨 تنسيق النص")
+                
+                # Font settings with keys
+                font_options = ["Arial", "Noto Sans Arabic", "Amiri", "Cairo", "Tajawal"]
+                font_family = st.selectbox(
+                    "نوع الخط",
+                    font_options,
+                    key='setting_font_family'
                 )
+                
+                font_size = st.slider("حجم الخط", 12, 72, key='setting_font_size', help="اضبط حجم النص - قيم أكبر للنص الأوضح")
+                
+                text_wrap_width = st.slider(
+                    "عرض النص (حروف في السطر)", 
+                    20, 80, 
+                    key='setting_text_wrap_width',
+                    help="قلل القيمة لنص أقصر وأكثر وضوحاً، أو زدها لنص أطول"
+                )
+                
+                # Colors
+                text_color = st.color_picker("لون النص", key='setting_text_color')
+                bg_color = st.color_picker("لون الخلفية", key='setting_bg_color')
+                
+                # Stroke/Border
+                stroke_width = st.slider("سمك الحدود", 0, 5, key='setting_stroke_width')
+                stroke_color = st.color_picker("لون الحدود", key='setting_stroke_color')
+                
+                # Background opacity
+                bg_opacity = st.slider("شفافية الخلفية", 0.0, 1.0, key='setting_bg_opacity')
+                
+                # Text effects (shadow sliders are ignored while the shadow is off)
+                st.subheader("🌟 تأثيرات النص")
+                enable_shadow = st.checkbox("تفعيل الظل", key='setting_shadow_enabled')
+                shadow_offset_x = st.slider("إزاحة الظل أفقياً", -10, 10, key='setting_shadow_offset_x')
+                shadow_offset_y = st.slider("إزاحة الظل عمودياً", -10, 10, key='setting_shadow_offset_y')
+                shadow_blur = st.slider("ضبابية الظل", 0, 10, key='setting_shadow_blur')
+                if not enable_shadow:
+                    shadow_offset_x = 0
+                    shadow_offset_y = 0
+                    shadow_blur = 0
+                
+                st.markdown("---")
+                st.info("💡 الإعدادات الافتراضية محسّنة بجودة احترافية")
             
             with col2:
-                # Get original video resolution
-                video_info = processors['video'].get_video_info(st.session_state.video_file_path)
-                original_height = video_info['height']
+                st.subheader("📍 موضع النص")
                 
-                # Resolution options
-                resolution_options = ["الدقة الأصلية", "4K (2160p)", "1080p", "720p", "480p"]
-                resolution_index = 0
+                # Position
+                position_options = ["أسفل", "وسط", "أعلى"]
+                position = st.selectbox(
+                    "موقع الترجمة",
+                    position_options,
+                    key='setting_position'
+                )
                 
-                output_resolution = st.selectbox(
-                    "دقة الفيديو",
-                    resolution_options,
-                    index=resolution_index,
-                    help="اختر دقة الفيديو النهائي"
+                # Alignment
+                alignment_options = ["يمين", "وسط", "يسار"]
+                alignment = st.selectbox(
+                    "محاذاة النص",
+                    alignment_options,
+                    key='setting_alignment'
                 )
                 
+                # Margins
+                margin_horizontal = st.slider("الهامش الأفقي", 10, 100, key='setting_margin_horizontal')
+                margin_vertical = st.slider("الهامش العمودي", 10, 100, key='setting_margin_vertical')
+            
+            st.subheader("⏱️ ضبط التوقيت")
+            
+            col3, col4 = st.columns(2)
+            
             with col3:
-                output_filename = st.text_input(
-                    "اسم الملف النهائي",
-                    value="video_with_subtitles",
-                    help="بدون امتداد الملف"
+                subtitle_offset = st.number_input(
+                    "تعديل توقيت الترجمة (بالثواني)",
+                    min_value=-30.0,
+                    max_value=30.0,
+                    step=0.1,
+                    help="قيمة موجبة للتأخير، قيمة سالبة للتقديم",
+                    key='setting_subtitle_offset'
                 )
+                
+            with col4:
+                if st.session_state.audio_file_path:
+                    audio_offset = st.number_input(
+                        "تعديل توقيت الصوت (بالثواني)",
+                        min_value=-30.0,
+                        max_value=30.0,
+                        step=0.1,
+                        help="قيمة موجبة للتأخير، قيمة سالبة للتقديم",
+                        key='setting_audio_offset'
+                    )
+                    
+                    audio_volume = st.slider("مستوى الصوت", 0.0, 2.0, 0.1, key='setting_audio_volume')
+                else:
+                    audio_offset = 0.0
+                    audio_volume = 1.0
             
-            if st.button("🚀 تصدير الفيديو النهائي", type="primary"):
-                with st.spinner("جاري تصدير الفيديو النهائي... هذا قد يستغرق بعض الوقت"):
-                    try:
-                        # Quality settings mapping
-                        quality_settings = {
-                            "عالية جداً (أبطأ)": {"preset": "slow", "crf": 18},
-                            "عالية": {"preset": "medium", "crf": 23},
-                            "متوسطة": {"preset": "fast", "crf": 28},
-                            "سريعة": {"preset": "veryfast", "crf": 32}
-                        }
-                        
-                        # Resolution mapping
-                        resolution_mapping = {
-                            "الدقة الأصلية": None,
-                            "4K (2160p)": 2160,
-                            "1080p": 1080,
-                            "720p": 720,
-                            "480p": 480
-                        }
-                        
-                        settings = quality_settings[output_quality]
-                        target_height = resolution_mapping[output_resolution]
-                        
-                        final_video_path = processors['video'].export_final_video(
-                            video_path=st.session_state.video_file_path,
-                            subtitles_data=st.session_state.subtitles_data,
-                            audio_path=st.session_state.audio_file_path,
-                            settings=st.session_state.subtitle_settings,
-                            arabic_processor=processors['arabic_text'],
-                            subtitle_renderer=processors['subtitle'],
-                            output_filename=output_filename,
-                            quality_settings=settings,
-                            target_resolution=target_height
-                        )
-                        
-                        st.success("✅ تم تصدير الفيديو بنجاح!")
-                        
-                        # Provide download link
-                        with open(final_video_path, 'rb') as f:
-                            video_data = f.read()
-                        
-                        st.download_button(
-                            label="📥 تحميل الفيديو النهائي",
-                            data=video_data,
-                            file_name=f"{output_filename}.mp4",
-                            mime="video/mp4"
-                        )
-                        
-                        # Show file info
-                        file_size = os.path.getsize(final_video_path) / (1024 * 1024)  # MB
-                        st.info(f"حجم الملف النهائي: {file_size:.2f} MB")
-                        
-                    except Exception as e:
-                        st.error(f"❌ خطأ في التصدير: {str(e)}")
+            submitted = st.form_submit_button("✅ تطبيق الإعدادات", type="primary")
+        
+        # Store settings in session state once they are applied
+        if submitted or 'subtitle_settings' not in st.session_state:
+            st.session_state.subtitle_settings = {
+                'font_family': font_family,
+                'font_size': font_size,
+                'text_color': text_color,
+                'bg_color': bg_color,
+                'stroke_width': stroke_width,
+                'stroke_color': stroke_color,
+                'bg_opacity': bg_opacity,
+                'position': position,
+                'alignment': alignment,
+                'margin_horizontal': margin_horizontal,
+                'margin_vertical': margin_vertical,
+                'subtitle_offset': subtitle_offset,
+                'audio_offset': audio_offset,
+                'audio_volume': audio_volume,
+                'shadow_enabled': enable_shadow,
+                'shadow_offset_x': shadow_offset_x,
+                'shadow_offset_y': shadow_offset_y,
+                'shadow_blur': shadow_blur,
+                'text_wrap_width': text_wrap_width
+            }
+        
+        # Settings save/load section
+        st.markdown("---")
+        st.subheader("💾 حفظ وتحميل الإعدادات")
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            preset_name = st.text_input("اسم المجموعة", value="my_preset", help="اسم لحفظ الإعدادات الحالية")
+            if st.button("💾 حفظ الإعدادات الحالية"):
+                # Add current settings to the saved presets
+                presets = get_presets()
+                presets[preset_name] = st.session_state.subtitle_settings
+                
+                # Save back to file
+                with open(PRESETS_FILE, 'w', encoding='utf-8') as f:
+                    json.dump(presets, f, ensure_ascii=False, indent=2)
+                load_presets.clear()
+                
+                st.success(f"✅ تم حفظ الإعدادات باسم '{preset_name}'")
+        
+        with col2:
+            # Load presets
+            presets = get_presets()
+            if presets:
+                selected_preset = st.selectbox("اختر إعدادات محفوظة", list(presets.keys()))
+                if st.button("📥 تحميل الإعدادات"):
+                    st.info(f"💡 لتحميل الإعدادات '{selected_preset}'، يرجى نسخ القيم يدوياً من الملف subtitle_presets.json")
+            else:
+                st.info("لا توجد إعدادات محفوظة بعد")
+    
+    with tab2:
+        render_subtitle_editor()
+    
+    with tab3:
+        render_preview_section()
+    
+    with tab4:
+        render_export_section()
 
 else:
     # Instructions when no files are uploaded
@@ -831,23 +1166,3 @@ else:
     - جودة عالية في التصدير
     - واجهة سهلة وبديهية
     """)
-
-# Cleanup temp files on app restart
-def cleanup_temp_files():
-    temp_files = [
-        st.session_state.get('video_file_path'),
-        st.session_state.get('audio_file_path'),
-        st.session_state.get('subtitle_file_path'),
-        st.session_state.get('processed_video_path')
-    ]
-    
-    for file_path in temp_files:
-        if file_path and os.path.exists(file_path):
-            try:
-                os.unlink(file_path)
-            except:
-                pass
-
-# Register cleanup
-import atexit
-atexit.register(cleanup_temp_files)
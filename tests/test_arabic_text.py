@@ -0,0 +1,45 @@
+import random
+
+import arabic_reshaper
+import pytest
+from arabic_reshaper.letters import LETTERS_ARABIC
+
+from utils.arabic_text import RESHAPER_ONLY_PATTERN, reshape
+
+# Lam-Alef ligatures, tashkeel, tatweel, ZWJ, the Allah ligature and mixed
+# Latin/digits/punctuation around Arabic words
+CORPUS = [
+    "",
+    "بيت",
+    "السلام عليكم",
+    "لا إله إلا الله",
+    "قال لأخيه: لآلئ لإخوته",
+    "لا",
+    "ال",
+    "عبدالله",
+    "لله",
+    "مُحَمَّدٌ رَسُولُ اللَّهِ",
+    "ـــمـــ",
+    "ب‍ب",
+    "ل‍ا",
+    "ةءآأؤإئ",
+    "ى ي ك گ پ چ ژ",
+    "Hello مرحبا 123 ٤٥٦",
+    "كتب 2024 Python3 والعربية",
+    "(قوس) [مربع] «اقتباس»",
+    " متعدد  المسافات ",
+]
+
+@pytest.mark.parametrize("text", CORPUS)
+def test_reshape_matches_arabic_reshaper(text):
+    assert reshape(text) == arabic_reshaper.reshape(text)
+
+def test_reshape_matches_arabic_reshaper_on_random_letter_runs():
+    # Only characters the fast path shapes itself, plus non-joining neighbours
+    alphabet = [letter for letter in LETTERS_ARABIC if not RESHAPER_ONLY_PATTERN.match(letter)]
+    alphabet += [' ', '1', 'a', '.']
+    rng = random.Random(0)
+    
+    for _ in range(5000):
+        text = ''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 12)))
+        assert reshape(text) == arabic_reshaper.reshape(text), text
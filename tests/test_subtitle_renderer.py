@@ -0,0 +1,44 @@
+import pytest
+
+pytest.importorskip("pysrt")
+pytest.importorskip("pysubs2")
+pytest.importorskip("webvtt")
+
+from utils.subtitle_renderer import SubtitleRenderer, format_srt_time
+
+WHITESPACE_SEPARATED_SRT = (
+    "1\n00:00:01,000 --> 00:00:02,000\nA\n \n"
+    "2\n00:00:03,000 --> 00:00:04,000\nB\n"
+)
+
+def test_parse_srt_whitespace_only_separator(tmp_path):
+    srt_path = tmp_path / "cues.srt"
+    srt_path.write_text(WHITESPACE_SEPARATED_SRT, encoding="utf-8")
+    
+    subtitles = SubtitleRenderer().parse_srt(str(srt_path))
+    
+    assert [sub['text'] for sub in subtitles] == ['A', 'B']
+    assert subtitles[1]['index'] == 2
+    assert subtitles[1]['start'] == 3.0
+    assert subtitles[1]['end'] == 4.0
+
+def test_validate_srt_whitespace_only_separator(tmp_path):
+    srt_path = tmp_path / "cues.srt"
+    srt_path.write_text(WHITESPACE_SEPARATED_SRT, encoding="utf-8")
+    
+    result = SubtitleRenderer().validate_srt_file(str(srt_path))
+    
+    assert result['valid']
+    assert result['subtitle_count'] == 2
+
+@pytest.mark.parametrize("seconds, expected", [
+    (0, "00:00:00,000"),
+    (1.0005, "00:00:01,000"),
+    (1.0006, "00:00:01,001"),
+    (59.9995, "00:01:00,000"),
+    (3599.9996, "01:00:00,000"),
+    (3661.001, "01:01:01,001"),
+    (360000.25, "100:00:00,250"),
+])
+def test_format_srt_time(seconds, expected):
+    assert format_srt_time(seconds) == expected
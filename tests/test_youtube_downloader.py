@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+pytest.importorskip("yt_dlp")
+
+from utils.youtube_downloader import YouTubeDownloader
+
+VTT = (
+    "﻿WEBVTT\r\n"
+    "Kind: captions\r\n"
+    "Language: ar\r\n"
+    "\r\n"
+    "NOTE converted from YouTube\r\n"
+    "\r\n"
+    "STYLE\r\n"
+    "::cue { color: white }\r\n"
+    "\r\n"
+    "1\r\n"
+    "00:00:12.500 --> 00:01:02.050 align:start position:0%\r\n"
+    "مرحبا<00:00:13.000><c> بكم</c>\r\n"
+    "<i>سطر ثان</i>\r\n"
+    "\r\n"
+    "01:00.000 --> 01:01.5\r\n"
+    " \r\n"
+    "\r\n"
+    "59:59.999 --> 1:00:00.000\r\n"
+    "last\r\n"
+)
+
+SRT = (
+    "1\n"
+    "00:00:12,500 --> 00:01:02,050\n"
+    "مرحبا بكم\n"
+    "سطر ثان\n"
+    "\n"
+    "2\n"
+    "00:59:59,999 --> 01:00:00,000\n"
+    "last\n"
+)
+
+@pytest.fixture
+def downloader(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return YouTubeDownloader()
+
+def test_convert_vtt_to_srt(downloader, tmp_path):
+    vtt_path = tmp_path / "video.ar.vtt"
+    vtt_path.write_bytes(VTT.encode("utf-8"))
+    
+    srt_path = downloader._convert_vtt_to_srt(str(vtt_path))
+    
+    assert srt_path == str(tmp_path / "video.ar.srt")
+    with open(srt_path, encoding="utf-8") as f:
+        assert f.read() == SRT
+
+def test_convert_vtt_to_srt_reuses_up_to_date_srt(downloader, tmp_path):
+    vtt_path = tmp_path / "video.ar.vtt"
+    vtt_path.write_bytes(VTT.encode("utf-8"))
+    srt_path = downloader._convert_vtt_to_srt(str(vtt_path))
+    
+    with open(srt_path, "w", encoding="utf-8") as f:
+        f.write("kept")
+    os.utime(srt_path, ns=(os.stat(vtt_path).st_mtime_ns + 1,) * 2)
+    
+    assert downloader._convert_vtt_to_srt(str(vtt_path)) == srt_path
+    with open(srt_path, encoding="utf-8") as f:
+        assert f.read() == "kept"
@@ -1,7 +1,100 @@
 import arabic_reshaper
+from arabic_reshaper.letters import LETTERS_ARABIC, ISOLATED, INITIAL, MEDIAL, FINAL
 from bidi.algorithm import get_display
+import functools
 import re
 
+# Record separator used to reshape many strings in a single call; it is a
+# non-joining control character so letters never connect across it
+BATCH_SEPARATOR = '\x1e'
+
+# Joining behaviour of every letter, precomputed once from arabic_reshaper's table
+JOINS_BEFORE = {letter for letter, forms in LETTERS_ARABIC.items() if forms[FINAL] or forms[MEDIAL]}
+JOINS_AFTER = {letter for letter, forms in LETTERS_ARABIC.items() if forms[INITIAL] or forms[MEDIAL]}
+JOINS_BOTH = {letter for letter, forms in LETTERS_ARABIC.items() if forms[MEDIAL]}
+
+# Lam-Alef ligatures enabled in arabic_reshaper's default configuration (isolated, final)
+LAM = '\u0644'
+LAM_ALEF_LIGATURES = {
+    '\u0627': ('\uFEFB', '\uFEFC'),
+    '\u0623': ('\uFEF7', '\uFEF8'),
+    '\u0625': ('\uFEF9', '\uFEFA'),
+    '\u0622': ('\uFEF5', '\uFEF6')
+}
+
+# Harakat, tatweel, ZWJ and the Allah ligature need arabic_reshaper's full handling
+RESHAPER_ONLY_PATTERN = re.compile(
+    '[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06dc\u06df-\u06e8\u06ea-\u06ed\u08d4-\u08ff\u0640\u200d]'
+    '|\u0627\u0644\u0644\u0647'
+)
+
+# Patterns used by clean_text, normalize_arabic and is_arabic
+HTML_TAG_PATTERN = re.compile(r'<[^>]+>')
+TEH_MARBUTA_PATTERN = re.compile(r'ة(?=\s|$)')
+ARABIC_PATTERN = re.compile(r'[\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF\uFB50-\uFDFF\uFE70-\uFEFF]')
+
+# Alef variants to plain Alef, Yeh with Hamza to Yeh
+NORMALIZE_TABLE = str.maketrans({'آ': 'ا', 'أ': 'ا', 'إ': 'ا', 'ٱ': 'ا', 'ئ': 'ي'})
+
+def reshape(text):
+    """
+    Reshape Arabic text into presentation forms
+    
+    Plain text (the common subtitle case) is shaped with a single scan over
+    precomputed tables; anything else goes through arabic_reshaper, whose
+    default configuration this matches exactly.
+    
+    Args:
+        text (str): Logical-order Arabic text
+        
+    Returns:
+        str: Text with letters replaced by their contextual forms
+    """
+    if RESHAPER_ONLY_PATTERN.search(text):
+        return arabic_reshaper.reshape(text)
+    
+    letters = list(text)
+    forms = [None] * len(letters)
+    
+    for i, letter in enumerate(letters):
+        if letter not in LETTERS_ARABIC:
+            continue
+        previous = letters[i - 1] if i else None
+        previous_form = forms[i - 1] if i else None
+        if (previous_form is None or letter not in JOINS_BEFORE or
+                previous not in JOINS_AFTER or
+                (previous_form == FINAL and previous not in JOINS_BOTH)):
+            forms[i] = ISOLATED
+        else:
+            forms[i - 1] = INITIAL if previous_form == ISOLATED else MEDIAL
+            forms[i] = FINAL
+    
+    shaped = [letter if form is None else LETTERS_ARABIC[letter][form]
+              for letter, form in zip(letters, forms)]
+    
+    # Fold Lam followed by Alef into a single ligature glyph
+    for i in range(len(letters) - 1):
+        if letters[i] == LAM and letters[i + 1] in LAM_ALEF_LIGATURES:
+            isolated, final = LAM_ALEF_LIGATURES[letters[i + 1]]
+            shaped[i] = isolated if forms[i] in (ISOLATED, INITIAL) else final
+            shaped[i + 1] = ''
+    
+    return ''.join(shaped)
+
+@functools.lru_cache(maxsize=4096)
+def shape_text(text):
+    """
+    Reshape and reorder cleaned text for display, memoized so repeated lines
+    (and re-renders with unchanged subtitles) skip the work entirely
+    
+    Args:
+        text (str): Cleaned logical-order text
+        
+    Returns:
+        str: Display-order text with joined letter forms
+    """
+    return get_display(reshape(text))
+
 class ArabicTextProcessor:
     """
     Handler for Arabic text processing including reshaping and bidirectional text support
@@ -24,18 +117,36 @@ class ArabicTextProcessor:
             # Clean the text first
             cleaned_text = self.clean_text(text)
             
-            # Reshape Arabic text to connect letters properly
-            reshaped_text = arabic_reshaper.reshape(cleaned_text)
-            
-            # Apply bidirectional algorithm for proper RTL display
-            bidi_text = get_display(reshaped_text)
-            
-            return bidi_text
+            # Reshape Arabic text to connect letters properly and apply the
+            # bidirectional algorithm for proper RTL display
+            return shape_text(cleaned_text)
             
         except Exception as e:
             print(f"Error processing Arabic text: {e}")
             return text  # Return original if processing fails
     
+    def process_batch(self, texts):
+        """
+        Process many texts with a single reshaping pass
+        
+        Args:
+            texts (list): Raw Arabic texts
+            
+        Returns:
+            list: Processed texts in the same order
+        """
+        try:
+            cleaned = [self.clean_text(text).replace(BATCH_SEPARATOR, ' ') for text in texts]
+            
+            # Reshape everything at once, then apply bidi per text so lines
+            # are never reordered across each other
+            reshaped = reshape(BATCH_SEPARATOR.join(cleaned))
+            return [get_display(text) for text in reshaped.split(BATCH_SEPARATOR)]
+            
+        except Exception as e:
+            print(f"Error processing Arabic text batch: {e}")
+            return [self.process_text(text) for text in texts]
+    
     def clean_text(self, text):
         """
         Clean text by removing unwanted characters and normalizing
@@ -47,16 +158,15 @@ class ArabicTextProcessor:
             str: Cleaned text
         """
         # Remove HTML tags if any
-        text = re.sub(r'<[^>]+>', '', text)
+        text = HTML_TAG_PATTERN.sub('', text)
         
-        # Remove excessive whitespace
-        text = re.sub(r'\s+', ' ', text)
+        # Collapse and strip whitespace, normalizing Alef and Yeh in the same pass
+        text = ' '.join(text.translate(NORMALIZE_TABLE).split())
         
-        # Strip leading/trailing whitespace
-        text = text.strip()
-        
-        # Normalize Arabic characters
-        text = self.normalize_arabic(text)
+        # Only single spaces are left, so word-final Teh Marbuta is a plain replace
+        text = text.replace('ة ', 'ه ')
+        if text.endswith('ة'):
+            text = text[:-1] + 'ه'
         
         return text
     
@@ -70,14 +180,11 @@ class ArabicTextProcessor:
         Returns:
             str: Normalized text
         """
-        # Convert different forms of Alef to standard Alef
-        text = re.sub(r'[آأإٱ]', 'ا', text)
+        # Convert different forms of Alef to standard Alef and normalize Yeh
+        text = text.translate(NORMALIZE_TABLE)
         
         # Convert Teh Marbuta to Heh when at word end
-        text = re.sub(r'ة(?=\s|$)', 'ه', text)
-        
-        # Normalize Yeh
-        text = re.sub(r'[يئ]', 'ي', text)
+        text = TEH_MARBUTA_PATTERN.sub('ه', text)
         
         return text
     
@@ -92,20 +199,23 @@ class ArabicTextProcessor:
         Returns:
             list: List of text lines
         """
-        words = text.split()
         lines = []
-        current_line = ""
+        line_words = []
+        line_length = 0
         
-        for word in words:
-            if len(current_line + " " + word) <= max_chars_per_line:
-                current_line += " " + word if current_line else word
+        # Greedy wrap tracking the line length, joining each line once
+        for word in text.split():
+            if line_length + 1 + len(word) <= max_chars_per_line:
+                line_length = line_length + 1 + len(word) if line_words else len(word)
+                line_words.append(word)
             else:
-                if current_line:
-                    lines.append(current_line.strip())
-                current_line = word
+                if line_words:
+                    lines.append(' '.join(line_words))
+                line_words = [word]
+                line_length = len(word)
         
-        if current_line:
-            lines.append(current_line.strip())
+        if line_words:
+            lines.append(' '.join(line_words))
         
         return lines
     
@@ -134,8 +244,7 @@ class ArabicTextProcessor:
         Returns:
             bool: True if text contains Arabic characters
         """
-        arabic_pattern = re.compile(r'[\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF\uFB50-\uFDFF\uFE70-\uFEFF]')
-        return bool(arabic_pattern.search(text))
+        return bool(ARABIC_PATTERN.search(text))
     
     def get_text_direction(self, text):
         """
@@ -163,7 +272,24 @@ class ArabicTextProcessor:
         Returns:
             str: Formatted subtitle text
         """
-        if max_width:
-            return self.process_multiline_text(text, max_width)
-        else:
-            return self.process_text(text)
+        return format_subtitle_text(text, max_width)
+
+@functools.lru_cache(maxsize=4096)
+def format_subtitle_text(text, max_width=None):
+    """
+    Format subtitle text with proper line breaks and processing, memoized per
+    (text, width) at module level so every processor instance in the process
+    (each render job unpickles its own) shares the cache
+    
+    Args:
+        text (str): Raw subtitle text
+        max_width (int, optional): Maximum characters per line
+        
+    Returns:
+        str: Formatted subtitle text
+    """
+    processor = ArabicTextProcessor()
+    if max_width:
+        return processor.process_multiline_text(text, max_width)
+    else:
+        return processor.process_text(text)
@@ -1,6 +1,7 @@
-from moviepy import AudioFileClip
+from moviepy import AudioFileClip, afx
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+import soundfile as sf
 import os
-import librosa
 
 class AudioHandler:
     """
@@ -10,6 +11,28 @@ class AudioHandler:
     def __init__(self):
         pass
     
+    def read_audio_header(self, audio_path):
+        """
+        Read duration, sample rate and channel count from the file header
+        without decoding any audio
+        
+        Args:
+            audio_path (str): Path to audio file
+            
+        Returns:
+            tuple: (duration, sample_rate, channels)
+        """
+        try:
+            # libsndfile covers WAV, FLAC, OGG and MP3
+            info = sf.info(audio_path)
+            return info.frames / info.samplerate, info.samplerate, info.channels
+        except Exception:
+            # AAC/M4A and other containers: ffmpeg probe of the header
+            infos = ffmpeg_parse_infos(audio_path)
+            if not infos.get('audio_found'):
+                raise Exception("No audio stream found")
+            return infos['duration'], infos['audio_fps'], 2  # Assume stereo
+    
     def get_audio_info(self, audio_path):
         """
         Extract audio file information
@@ -21,24 +44,11 @@ class AudioHandler:
             dict: Audio information
         """
         try:
-            # Use MoviePy for basic info
-            with AudioFileClip(audio_path) as audio_clip:
-                duration = audio_clip.duration
-                fps = audio_clip.fps
-            
-            # Try to get more detailed info with librosa
-            try:
-                y, sr = librosa.load(audio_path, sr=None)
-                sample_rate = sr
-                channels = 1 if len(y.shape) == 1 else y.shape[0]
-            except:
-                # Fallback to basic info
-                sample_rate = fps
-                channels = 2  # Assume stereo
+            duration, sample_rate, channels = self.read_audio_header(audio_path)
             
             info = {
                 'duration': duration,
-                'sample_rate': int(sample_rate) if sample_rate else fps,
+                'sample_rate': int(sample_rate),
                 'channels': channels,
                 'size': os.path.getsize(audio_path) / (1024 * 1024)  # MB
             }
@@ -110,8 +120,6 @@ class AudioHandler:
             AudioFileClip: Adjusted audio clip
         """
         try:
-            audio_clip = AudioFileClip(audio_path)
-            
             # Apply settings first
             processed_audio = self.process_audio(audio_path, settings)
             
@@ -122,10 +130,8 @@ class AudioHandler:
             elif processed_audio.duration < video_duration:
                 # Loop audio if significantly shorter
                 if video_duration / processed_audio.duration > 1.5:
-                    loops_needed = int(video_duration / processed_audio.duration) + 1
-                    audio_segments = [processed_audio] * loops_needed
-                    processed_audio = processed_audio.concatenate_audioclips(audio_segments)
-                    processed_audio = processed_audio.subclip(0, video_duration)
+                    # AudioLoop maps time back into the clip instead of concatenating copies
+                    processed_audio = processed_audio.with_effects([afx.AudioLoop(duration=video_duration)])
             
             return processed_audio
             
@@ -143,15 +149,12 @@ class AudioHandler:
             dict: Validation result
         """
         try:
-            # Try to open with MoviePy
-            with AudioFileClip(audio_path) as audio_clip:
-                duration = audio_clip.duration
-                fps = audio_clip.fps
+            duration, sample_rate, _ = self.read_audio_header(audio_path)
             
             return {
                 'valid': True,
                 'duration': duration,
-                'sample_rate': fps,
+                'sample_rate': sample_rate,
                 'format': os.path.splitext(audio_path)[1].lower()
             }
             
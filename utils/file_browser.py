@@ -8,6 +8,8 @@ class FileBrowser:
     
     def __init__(self, base_path='.'):
         self.base_path = Path(base_path).resolve()
+        # Directory listings keyed by path: (st_mtime_ns, subdirectories, file names)
+        self.dir_cache = {}
     
     def get_files_by_extension(self, extensions, exclude_dirs=None):
         """
@@ -23,18 +25,43 @@ class FileBrowser:
         if exclude_dirs is None:
             exclude_dirs = ['.git', '__pycache__', 'node_modules', '.venv', 'venv', '.local', '.cache']
         
+        extension_set = frozenset(ext.lower() for ext in extensions)
+        exclude_set = frozenset(exclude_dirs)
         files = []
         
-        for root, dirs, filenames in os.walk(self.base_path):
-            dirs[:] = [d for d in dirs if d not in exclude_dirs]
+        def scan(directory, prefix):
+            # A directory's mtime changes whenever entries are added, removed or
+            # renamed, so an unchanged directory is served from the cache
+            try:
+                mtime = os.stat(directory).st_mtime_ns
+                cached = self.dir_cache.get(directory)
+                if cached is None or cached[0] != mtime:
+                    # DirEntry carries the file type from the directory read itself
+                    subdirs, names = [], []
+                    with os.scandir(directory) as entries:
+                        for entry in entries:
+                            if entry.is_dir():
+                                if not entry.is_symlink():
+                                    subdirs.append((entry.name, entry.path))
+                            else:
+                                names.append(entry.name)
+                    cached = (mtime, subdirs, names)
+                    self.dir_cache[directory] = cached
+            except OSError:
+                # Unreadable directories are skipped
+                return
             
-            for filename in filenames:
-                if any(filename.lower().endswith(ext.lower()) for ext in extensions):
-                    file_path = Path(root) / filename
-                    relative_path = file_path.relative_to(self.base_path)
-                    files.append(str(relative_path))
+            _, subdirs, names = cached
+            for name in names:
+                if os.path.splitext(name)[1].lower() in extension_set:
+                    files.append(prefix + name)
+            for name, path in subdirs:
+                if name not in exclude_set:
+                    scan(path, prefix + name + os.sep)
         
-        return sorted(files)
+        scan(str(self.base_path), '')
+        files.sort()
+        return files
     
     def get_video_files(self):
         """
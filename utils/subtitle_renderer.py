@@ -1,11 +1,208 @@
-from moviepy import TextClip, CompositeVideoClip
 import pysrt
 import pysubs2
 import webvtt
 from PIL import Image, ImageDraw, ImageFont
 import numpy as np
+import functools
+import bisect
+import codecs
+import math
 import tempfile
 import os
+import re
+from pathlib import Path
+
+# Single-pass SRT scanner: cue index, start/end timestamps and the text lines
+# up to the next blank (empty or whitespace-only) line
+_SRT_RE = re.compile(
+    rb'(\d+)[ \t]*\r?\n'
+    rb'(\d+):(\d\d):(\d\d)[,.](\d{1,3})[ \t]*-->[ \t]*(\d+):(\d\d):(\d\d)[,.](\d{1,3})[^\r\n]*(?:\r?\n|\Z)'
+    rb'((?:[^\S\r\n]*\S[^\r\n]*(?:\r?\n|\Z))*)'
+)
+
+# WebVTT timestamp, hours optional: [HH:]MM:SS.mmm
+_VTT_TIME_RE = re.compile(r'(?:(\d+):)?(\d+):(\d+)\.(\d+)$')
+
+# Any letter from the basic Arabic block
+_ARABIC_RE = re.compile(r'[\u0621-\u064A]')
+
+@functools.lru_cache(maxsize=None)
+def load_font(font_path, font_size):
+    """
+    Load a TrueType font once per process and size
+    
+    Args:
+        font_path (str): Path to the font file
+        font_size (int): Font size in pixels
+        
+    Returns:
+        ImageFont.FreeTypeFont: Loaded font (Pillow's default font if the file is missing)
+    """
+    if not os.path.exists(font_path):
+        return ImageFont.load_default(font_size)
+    return ImageFont.truetype(font_path, font_size)
+
+def draw_text_image(text, font_path, font_size, mode, fill, stroke_width=0, stroke_fill=None):
+    """
+    Draw (already shaped) text into a tightly cropped Pillow image
+    
+    Args:
+        text (str): Display-order text, lines separated by newlines
+        font_path (str): Path to the font file
+        font_size (int): Font size in pixels
+        mode (str): Pillow image mode ('RGBA' or 'L')
+        fill: Fill color for the mode
+        stroke_width (int): Outline width in pixels
+        stroke_fill: Outline color for the mode
+        
+    Returns:
+        Image.Image: Image cropped to the text's bounding box
+    """
+    font = load_font(font_path, font_size)
+    left, top, right, bottom = ImageDraw.Draw(Image.new(mode, (1, 1))).multiline_textbbox(
+        (0, 0), text, font=font, stroke_width=stroke_width, align='center'
+    )
+    left, top = math.floor(left), math.floor(top)
+    image = Image.new(mode, (max(1, math.ceil(right) - left), max(1, math.ceil(bottom) - top)), 0)
+    ImageDraw.Draw(image).multiline_text(
+        (-left, -top), text, font=font, fill=fill,
+        stroke_width=stroke_width, stroke_fill=stroke_fill, align='center'
+    )
+    return image
+
+@functools.lru_cache(maxsize=512)
+def render_text_rgba(text, font_path, font_size, color, stroke_width=0, stroke_color=None):
+    """
+    Render (already shaped) text to a tightly cropped RGBA image with Pillow
+    
+    Identical text and style share one read-only array, so repeated lines
+    render once per process.
+    
+    Args:
+        text (str): Display-order text, lines separated by newlines
+        font_path (str): Path to the font file
+        font_size (int): Font size in pixels
+        color (str): Fill color in hex
+        stroke_width (int): Outline width in pixels
+        stroke_color (str): Outline color in hex
+        
+    Returns:
+        np.ndarray: HxWx4 uint8 array
+    """
+    return np.asarray(draw_text_image(text, font_path, font_size, 'RGBA', color, stroke_width, stroke_color))
+
+@functools.lru_cache(maxsize=512)
+def render_text_mask(text, font_path, font_size, stroke_width=0, opacity=1.0):
+    """
+    Render the coverage of (already shaped) text, outline included, as a
+    single-channel alpha mask for layers drawn in one flat color
+    
+    Args:
+        text (str): Display-order text, lines separated by newlines
+        font_path (str): Path to the font file
+        font_size (int): Font size in pixels
+        stroke_width (int): Outline width in pixels
+        opacity (float): Factor applied to the mask (0-1)
+        
+    Returns:
+        np.ndarray: HxW uint8 array, the same size as render_text_rgba's
+    """
+    image = draw_text_image(text, font_path, font_size, 'L', 255, stroke_width, 255)
+    if opacity >= 1.0:
+        return np.asarray(image)
+    
+    mask = (np.asarray(image) * opacity + 0.5).astype(np.uint8)
+    mask.flags.writeable = False
+    return mask
+
+def frame_region(frame, overlay, x, y):
+    """
+    Clip an overlay placed at (x, y) to the frame
+    
+    Args:
+        frame (np.ndarray): HxWx3 frame
+        overlay (np.ndarray): Overlay whose first two axes are height and width
+        x (int): Left edge of the overlay in frame pixels
+        y (int): Top edge of the overlay in frame pixels
+        
+    Returns:
+        tuple: (frame view, matching overlay view), or None if they don't overlap
+    """
+    height, width = overlay.shape[:2]
+    x0, y0 = max(0, x), max(0, y)
+    x1, y1 = min(frame.shape[1], x + width), min(frame.shape[0], y + height)
+    if x0 >= x1 or y0 >= y1:
+        return None
+    return frame[y0:y1, x0:x1], overlay[y0 - y:y1 - y, x0 - x:x1 - x]
+
+def blend_rgba(frame, overlay, x, y):
+    """
+    Alpha-blend an RGBA overlay onto an RGB frame in place
+    
+    Uses 8-bit fixed point in uint16 (a*src + (255-a)*dst fits in 16 bits)
+    and touches only the overlay's rectangle, clipped to the frame.
+    
+    Args:
+        frame (np.ndarray): Writable HxWx3 uint8 frame
+        overlay (np.ndarray): hxwx4 uint8 overlay
+        x (int): Left edge of the overlay in frame pixels
+        y (int): Top edge of the overlay in frame pixels
+    """
+    regions = frame_region(frame, overlay, x, y)
+    if regions is None:
+        return
+    
+    region, src = regions
+    alpha = src[..., 3:4].astype(np.uint16)
+    region[...] = ((src[..., :3] * alpha + region * (255 - alpha) + 127) // 255).astype(np.uint8)
+
+def blend_mask(frame, mask, color, x, y):
+    """
+    Blend a flat color through a single-channel alpha mask onto an RGB frame in place
+    
+    Args:
+        frame (np.ndarray): Writable HxWx3 uint8 frame
+        mask (np.ndarray): hxw uint8 alpha mask
+        color (tuple): RGB color (r, g, b)
+        x (int): Left edge of the mask in frame pixels
+        y (int): Top edge of the mask in frame pixels
+    """
+    regions = frame_region(frame, mask, x, y)
+    if regions is None:
+        return
+    
+    region, src = regions
+    alpha = src[..., None].astype(np.uint16)
+    color = np.array(color, dtype=np.uint16)
+    region[...] = ((color * alpha + region * (255 - alpha) + 127) // 255).astype(np.uint8)
+
+@functools.lru_cache(maxsize=64)
+def hex_to_rgb(hex_color):
+    """
+    Convert hex color to RGB tuple, parsing each distinct color once
+    
+    Args:
+        hex_color (str): Color in hex format (#FFFFFF)
+        
+    Returns:
+        tuple: RGB values (r, g, b)
+    """
+    return tuple(bytes.fromhex(hex_color.lstrip('#'))[:3])
+
+def format_srt_time(seconds):
+    """
+    Format seconds as an SRT timestamp, rounding to the nearest millisecond
+    
+    Args:
+        seconds (float): Time in seconds
+        
+    Returns:
+        str: Timestamp (HH:MM:SS,mmm)
+    """
+    hours, remainder = divmod(round(seconds * 1000), 3600000)
+    minutes, remainder = divmod(remainder, 60000)
+    secs, millis = divmod(remainder, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d},{millis:03d}"
 
 class SubtitleRenderer:
     """
@@ -13,7 +210,29 @@ class SubtitleRenderer:
     """
     
     def __init__(self):
-        pass
+        self.font_path = os.path.join(os.getcwd(), "assets/fonts/NotoSansArabic.ttf")
+    
+    def get_font(self, font_size):
+        """
+        Load the bundled Arabic font at a given size, reusing loaded fonts
+        
+        Args:
+            font_size (int): Font size in pixels
+            
+        Returns:
+            ImageFont.FreeTypeFont: Loaded font
+        """
+        return load_font(self.font_path, font_size)
+    
+    def preload_font(self, font_size=42):
+        """
+        Load the bundled font ahead of the first render
+        
+        Args:
+            font_size (int): Font size to warm up
+        """
+        if os.path.exists(self.font_path):
+            self.get_font(font_size)
     
     def parse_srt(self, srt_path):
         """
@@ -26,18 +245,28 @@ class SubtitleRenderer:
             list: List of subtitle entries
         """
         try:
-            subs = pysrt.open(srt_path, encoding='utf-8')
-            subtitle_data = []
-            
-            for sub in subs:
-                subtitle_data.append({
-                    'index': sub.index,
-                    'start': self.time_to_seconds(sub.start),
-                    'end': self.time_to_seconds(sub.end),
-                    'text': sub.text.replace('\n', ' ')  # Join multiline text
-                })
-            
-            return subtitle_data
+            # Read raw bytes and scan every cue with one compiled regex
+            data = Path(srt_path).read_bytes()
+            if data.startswith(codecs.BOM_UTF8):
+                data = data[len(codecs.BOM_UTF8):]
+            
+            subtitle_data = [{
+                'index': int(m.group(1)),
+                'start': int(m.group(2)) * 3600 + int(m.group(3)) * 60 + int(m.group(4)) + int(m.group(5)) / 1000.0,
+                'end': int(m.group(6)) * 3600 + int(m.group(7)) * 60 + int(m.group(8)) + int(m.group(9)) / 1000.0,
+                'text': ' '.join(m.group(10).decode('utf-8').splitlines())  # Join multiline text
+            } for m in _SRT_RE.finditer(data)]
+            
+            if subtitle_data or not data.strip():
+                return subtitle_data
+            
+            # Nothing matched the strict layout; fall back to pysrt's more tolerant parser
+            return [{
+                'index': sub.index,
+                'start': self.time_to_seconds(sub.start),
+                'end': self.time_to_seconds(sub.end),
+                'text': ' '.join(sub.text.splitlines())
+            } for sub in pysrt.from_string(data.decode('utf-8'))]
             
         except Exception as e:
             raise Exception(f"Error parsing SRT file: {str(e)}")
@@ -52,10 +281,8 @@ class SubtitleRenderer:
         Returns:
             float: Time in seconds
         """
-        return (time_obj.hours * 3600 + 
-                time_obj.minutes * 60 + 
-                time_obj.seconds + 
-                time_obj.milliseconds / 1000.0)
+        # ordinal is the whole timestamp in milliseconds
+        return time_obj.ordinal / 1000.0
     
     def parse_ass(self, ass_path):
         """
@@ -69,17 +296,13 @@ class SubtitleRenderer:
         """
         try:
             subs = pysubs2.load(ass_path, encoding='utf-8')
-            subtitle_data = []
-            
-            for i, sub in enumerate(subs):
-                subtitle_data.append({
-                    'index': i + 1,
-                    'start': sub.start / 1000.0,  # Convert ms to seconds
-                    'end': sub.end / 1000.0,
-                    'text': sub.text.replace('\\N', ' ')  # Replace ASS newline with space
-                })
             
-            return subtitle_data
+            return [{
+                'index': i,
+                'start': sub.start / 1000.0,  # Convert ms to seconds
+                'end': sub.end / 1000.0,
+                'text': sub.text.replace('\\N', ' ')  # Replace ASS newline with space
+            } for i, sub in enumerate(subs, 1)]
             
         except Exception as e:
             raise Exception(f"Error parsing ASS file: {str(e)}")
@@ -95,22 +318,16 @@ class SubtitleRenderer:
             list: List of subtitle entries
         """
         try:
-            subtitle_data = []
-            
             vtt_content = webvtt.read(vtt_path)
-            for i, caption in enumerate(vtt_content):
-                # Convert VTT time format to seconds
-                start = self.vtt_time_to_seconds(caption.start)
-                end = self.vtt_time_to_seconds(caption.end)
-                
-                subtitle_data.append({
-                    'index': i + 1,
-                    'start': start,
-                    'end': end,
-                    'text': caption.text.replace('\n', ' ')
-                })
+            to_seconds = self.vtt_time_to_seconds
             
-            return subtitle_data
+            # Convert VTT time format to seconds
+            return [{
+                'index': i,
+                'start': to_seconds(caption.start),
+                'end': to_seconds(caption.end),
+                'text': caption.text.replace('\n', ' ')
+            } for i, caption in enumerate(vtt_content, 1)]
             
         except Exception as e:
             raise Exception(f"Error parsing VTT file: {str(e)}")
@@ -125,6 +342,12 @@ class SubtitleRenderer:
         Returns:
             float: Time in seconds
         """
+        m = _VTT_TIME_RE.match(time_str)
+        if m:
+            hours, minutes, seconds, fraction = m.groups()
+            return (int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds)
+                    + int(fraction) / 10 ** len(fraction))
+        
         parts = time_str.split(':')
         
         if len(parts) == 3:
@@ -158,6 +381,59 @@ class SubtitleRenderer:
         else:
             raise Exception(f"Unsupported subtitle format: {file_format}")
     
+    def render_subtitle_layers(self, text, settings, arabic_processor):
+        """
+        Render a subtitle's text and optional shadow as cached arrays
+        
+        Single-color text (no outline, or an outline in the text color) and
+        the black shadow are kept as alpha masks; text with a differently
+        colored outline stays RGBA.
+        
+        Args:
+            text (str): Subtitle text
+            settings (dict): Subtitle formatting settings
+            arabic_processor: Arabic text processor instance
+            
+        Returns:
+            tuple: (text_overlay, text_rgb, shadow_mask); text_rgb is None when
+                text_overlay is RGBA, shadow_mask is None without a shadow
+        """
+        font_size = settings.get('font_size', 24)
+        text_color = settings.get('text_color', '#FFFFFF')
+        
+        try:
+            # Process Arabic text with custom wrap width
+            text_wrap_width = settings.get('text_wrap_width', 50)
+            processed_text = arabic_processor.format_subtitle_text(text, max_width=text_wrap_width)
+            
+            stroke_width = settings.get('stroke_width', 2)
+            stroke_color = settings.get('stroke_color', '#000000')
+            if stroke_width == 0 or stroke_color.lower() == text_color.lower():
+                text_overlay = render_text_mask(processed_text, self.font_path, font_size, stroke_width)
+                text_rgb = hex_to_rgb(text_color)
+            else:
+                text_overlay = render_text_rgba(
+                    processed_text, self.font_path, font_size, text_color, stroke_width, stroke_color
+                )
+                text_rgb = None
+            
+            shadow_mask = None
+            if settings.get('shadow_enabled', False) and (
+                settings.get('shadow_offset_x', 2) != 0 or settings.get('shadow_offset_y', 2) != 0
+            ):
+                # Black shadow faded by the blur setting, as in create_subtitle_clip
+                shadow_blur = settings.get('shadow_blur', 3)
+                shadow_opacity = max(0.3, 1.0 - (shadow_blur / 20.0)) if shadow_blur > 0 else 1.0
+                shadow_mask = render_text_mask(
+                    processed_text, self.font_path, font_size, stroke_width, shadow_opacity
+                )
+            
+            return text_overlay, text_rgb, shadow_mask
+            
+        except Exception as e:
+            print(f"Error rendering subtitle: {e}")
+            return render_text_rgba(text, self.font_path, font_size, text_color), None, None
+    
     def create_subtitle_clip(self, text, start_time, end_time, settings, arabic_processor):
         """
         Create a subtitle clip with specified settings including shadow effects
@@ -170,8 +446,10 @@ class SubtitleRenderer:
             arabic_processor: Arabic text processor instance
             
         Returns:
-            TextClip or CompositeVideoClip: Subtitle clip with effects
+            ImageClip: Subtitle clip with effects
         """
+        from moviepy import ImageClip
+        
         try:
             # Process Arabic text with custom wrap width
             text_wrap_width = settings.get('text_wrap_width', 50)
@@ -193,37 +471,26 @@ class SubtitleRenderer:
             
             duration = end_time - start_time
             
-            # Create main text clip with Arabic font
-            font_path = os.path.join(os.getcwd(), "assets/fonts/NotoSansArabic.ttf")
-            txt_clip = TextClip(
-                text=processed_text,
-                font_size=font_size,
-                color=text_color,
-                stroke_color=stroke_color,
-                stroke_width=stroke_width,
-                font=font_path
-            ).with_start(start_time).with_duration(duration)
+            # Create main text clip with Arabic font, rendered once per unique text and style
+            txt_clip = ImageClip(render_text_rgba(
+                processed_text, self.font_path, font_size, text_color, stroke_width, stroke_color
+            )).with_start(start_time).with_duration(duration)
             
             clips_to_composite = []
             
             # Add shadow if enabled - store explicit reference
             shadow_clip_ref = None
             if shadow_enabled and (shadow_offset_x != 0 or shadow_offset_y != 0):
-                # Create shadow clip (darker version of text) with Arabic font
-                font_path = os.path.join(os.getcwd(), "assets/fonts/NotoSansArabic.ttf")
-                shadow_clip_ref = TextClip(
-                    text=processed_text,
-                    font_size=font_size,
-                    color='#000000',  # Black shadow
-                    stroke_color='#000000',
-                    stroke_width=max(1, stroke_width - 1),
-                    font=font_path
-                ).with_start(start_time).with_duration(duration)
-                
                 # Apply blur effect by reducing opacity
-                if shadow_blur > 0:
-                    shadow_opacity = max(0.3, 1.0 - (shadow_blur / 20.0))
-                    shadow_clip_ref = shadow_clip_ref.with_opacity(shadow_opacity)
+                shadow_opacity = max(0.3, 1.0 - (shadow_blur / 20.0)) if shadow_blur > 0 else 1.0
+                
+                # Create shadow clip: black, with the text's coverage as its mask
+                shadow_mask = render_text_mask(
+                    processed_text, self.font_path, font_size, stroke_width, shadow_opacity
+                )
+                shadow_clip_ref = ImageClip(np.zeros(shadow_mask.shape + (3,), dtype=np.uint8)).with_mask(
+                    ImageClip(shadow_mask / 255.0, is_mask=True)
+                ).with_start(start_time).with_duration(duration)
                 
                 clips_to_composite.append(shadow_clip_ref)
             
@@ -248,13 +515,9 @@ class SubtitleRenderer:
         except Exception as e:
             print(f"Error creating subtitle clip: {e}")
             # Fallback to simple text clip with Arabic font
-            font_path = os.path.join(os.getcwd(), "assets/fonts/NotoSansArabic.ttf")
-            return TextClip(
-                text=text,
-                font_size=settings.get('font_size', 24),
-                color=settings.get('text_color', '#FFFFFF'),
-                font=font_path if os.path.exists(font_path) else None
-            ).with_start(start_time).with_duration(end_time - start_time)
+            return ImageClip(render_text_rgba(
+                text, self.font_path, settings.get('font_size', 24), settings.get('text_color', '#FFFFFF')
+            )).with_start(start_time).with_duration(end_time - start_time)
     
     def create_background_clip(self, text_clip, bg_color, opacity, start_time, duration):
         """
@@ -299,106 +562,262 @@ class SubtitleRenderer:
         Returns:
             tuple: RGB values (r, g, b)
         """
-        hex_color = hex_color.lstrip('#')
-        return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
+        return hex_to_rgb(hex_color)
     
-    def apply_subtitles(self, video_clip, subtitles_data, settings, arabic_processor, 
-                       preview_only=False, preview_end=None):
+    def hex_to_ass_color(self, hex_color, opacity=1.0):
         """
-        Apply subtitles to video clip
+        Convert hex color to a pysubs2 color
+        
+        Args:
+            hex_color (str): Color in hex format (#FFFFFF)
+            opacity (float): Opacity (0-1)
+            
+        Returns:
+            pysubs2.Color: Color with ASS alpha (0 is opaque)
+        """
+        r, g, b = self.hex_to_rgb(hex_color)
+        return pysubs2.Color(r, g, b, int(round(255 * (1.0 - opacity))))
+    
+    def to_ass(self, subtitles_data, settings, arabic_processor, video_size, output_path=None):
+        """
+        Write subtitles to an ASS file styled from the subtitle settings,
+        for burning in with ffmpeg's libass-based subtitles filter
         
         Args:
-            video_clip: MoviePy VideoFileClip
             subtitles_data (list): List of subtitle entries
             settings (dict): Subtitle settings
             arabic_processor: Arabic text processor instance
-            preview_only (bool): Whether this is for preview only
-            preview_end (float): End time for preview
+            video_size (tuple): Output video (width, height)
+            output_path (str, optional): Path for the ASS file
             
         Returns:
-            CompositeVideoClip: Video with subtitles
+            str: Path to the ASS file
         """
         try:
-            # Filter subtitles based on preview mode
-            if preview_only and preview_end:
-                filtered_subs = [sub for sub in subtitles_data 
-                               if sub['start'] < preview_end]
-            else:
-                filtered_subs = subtitles_data
+            width, height = video_size
             
-            # Apply subtitle offset
+            # Vertical rows and horizontal columns of the ASS numpad alignment
+            rows = {'أسفل': 1, 'وسط': 4, 'أعلى': 7}
+            columns = {'يسار': 0, 'وسط': 1, 'يمين': 2}
+            alignment = rows.get(settings.get('position', 'أسفل'), 1) + columns.get(settings.get('alignment', 'وسط'), 1)
+            
+            stroke_width = settings.get('stroke_width', 2)
+            shadow_enabled = settings.get('shadow_enabled', False)
+            shadow_offset_x = settings.get('shadow_offset_x', 2) if shadow_enabled else 0
+            shadow_offset_y = settings.get('shadow_offset_y', 2) if shadow_enabled else 0
+            shadow_blur = settings.get('shadow_blur', 3) if shadow_enabled else 0
+            
+            # Same shadow fading as the MoviePy renderer
+            shadow_opacity = max(0.3, 1.0 - (shadow_blur / 20.0)) if shadow_blur > 0 else 1.0
+            
+            subs = pysubs2.SSAFile()
+            subs.info['PlayResX'] = str(width)
+            subs.info['PlayResY'] = str(height)
+            subs.info['WrapStyle'] = '2'  # Lines are wrapped by text_wrap_width below
+            subs.info['ScaledBorderAndShadow'] = 'yes'
+            subs.styles['Default'] = pysubs2.SSAStyle(
+                fontname='Noto Sans Arabic',
+                fontsize=settings.get('font_size', 24),
+                primarycolor=self.hex_to_ass_color(settings.get('text_color', '#FFFFFF')),
+                outlinecolor=self.hex_to_ass_color(settings.get('stroke_color', '#000000')),
+                backcolor=self.hex_to_ass_color('#000000', shadow_opacity),
+                outline=stroke_width,
+                shadow=max(abs(shadow_offset_x), abs(shadow_offset_y)),
+                # Outline and drop shadow only; the MoviePy preview draws no background box
+                borderstyle=1,
+                alignment=pysubs2.Alignment(alignment),
+                marginl=settings.get('margin_horizontal', 20),
+                marginr=settings.get('margin_horizontal', 20),
+                marginv=settings.get('margin_vertical', 50)
+            )
+            
+            shadow_tags = f"{{\\xshad{shadow_offset_x}\\yshad{shadow_offset_y}}}" if shadow_enabled else ""
+            text_wrap_width = settings.get('text_wrap_width', 50)
             subtitle_offset = settings.get('subtitle_offset', 0)
             
-            # Create subtitle clips
-            subtitle_clips = []
-            for sub in filtered_subs:
+            for sub in subtitles_data:
                 start_time = max(0, sub['start'] + subtitle_offset)
                 end_time = sub['end'] + subtitle_offset
+                if end_time <= start_time:
+                    continue
                 
-                # Skip subtitles that are completely outside the video duration
-                if preview_only and preview_end:
-                    if start_time >= preview_end:
-                        continue
-                    if end_time > preview_end:
-                        end_time = preview_end
-                else:
-                    if start_time >= video_clip.duration:
-                        continue
-                    if end_time > video_clip.duration:
-                        end_time = video_clip.duration
+                # libass shapes and orders Arabic itself, so only clean and wrap
+                # the logical text here; pre-shaped text would be reversed twice
+                cleaned_text = arabic_processor.clean_text(sub['text'])
+                lines = arabic_processor.split_long_text(cleaned_text, text_wrap_width)
                 
+                subs.events.append(pysubs2.SSAEvent(
+                    start=int(start_time * 1000),
+                    end=int(end_time * 1000),
+                    text=shadow_tags + "\\N".join(lines)
+                ))
+            
+            if not output_path:
+                # mkstemp creates the file atomically, so the name can't be taken in between
+                fd, output_path = tempfile.mkstemp(suffix='.ass')
+                os.close(fd)
+            subs.save(output_path, encoding='utf-8', format_='ass')
+            
+            return output_path
+            
+        except Exception as e:
+            raise Exception(f"Error writing ASS file: {str(e)}")
+    
+    def to_vtt(self, subtitles_data, settings, arabic_processor, output_path=None):
+        """
+        Write subtitles to a WebVTT file for display as a browser text track
+        
+        Args:
+            subtitles_data (list): List of subtitle entries
+            settings (dict): Subtitle settings (offset and wrap width)
+            arabic_processor: Arabic text processor instance
+            output_path (str, optional): Path for the VTT file
+            
+        Returns:
+            str: Path to the VTT file
+        """
+        try:
+            text_wrap_width = settings.get('text_wrap_width', 50)
+            subtitle_offset = settings.get('subtitle_offset', 0)
+            
+            subs = pysubs2.SSAFile()
+            for sub in subtitles_data:
+                start_time = max(0, sub['start'] + subtitle_offset)
+                end_time = sub['end'] + subtitle_offset
                 if end_time <= start_time:
                     continue
                 
-                # Create subtitle clip
-                sub_clip = self.create_subtitle_clip(
-                    sub['text'], start_time, end_time, settings, arabic_processor
+                # Browsers shape Arabic themselves, so keep the logical text
+                cleaned_text = arabic_processor.clean_text(sub['text'])
+                lines = arabic_processor.split_long_text(cleaned_text, text_wrap_width)
+                
+                subs.events.append(pysubs2.SSAEvent(
+                    start=int(start_time * 1000),
+                    end=int(end_time * 1000),
+                    text="\\N".join(lines)
+                ))
+            
+            if not output_path:
+                fd, output_path = tempfile.mkstemp(suffix='.vtt')
+                os.close(fd)
+            subs.save(output_path, encoding='utf-8', format_='vtt')
+            
+            return output_path
+            
+        except Exception as e:
+            raise Exception(f"Error writing VTT file: {str(e)}")
+    
+    def apply_subtitles(self, video_clip, subtitles_data, settings, arabic_processor, 
+                       preview_only=False, preview_end=None):
+        """
+        Apply subtitles to video clip
+        
+        Args:
+            video_clip: MoviePy VideoFileClip
+            subtitles_data (list): List of subtitle entries
+            settings (dict): Subtitle settings
+            arabic_processor: Arabic text processor instance
+            preview_only (bool): Whether this is for preview only
+            preview_end (float): End time for preview
+            
+        Returns:
+            VideoClip: Video with subtitles, or video_clip itself when no
+                subtitle falls inside it
+        """
+        try:
+            if not subtitles_data:
+                return video_clip
+            
+            # Loop invariants: offset, time limit and shadow displacement
+            subtitle_offset = settings.get('subtitle_offset', 0)
+            time_limit = preview_end if preview_only and preview_end else video_clip.duration
+            
+            # Shift, clip and filter every cue's time window in one vectorized pass
+            count = len(subtitles_data)
+            raw_starts = np.fromiter((sub['start'] for sub in subtitles_data), dtype=np.float64, count=count)
+            raw_ends = np.fromiter((sub['end'] for sub in subtitles_data), dtype=np.float64, count=count)
+            starts = np.maximum(raw_starts + subtitle_offset, 0)
+            ends = np.minimum(raw_ends + subtitle_offset, time_limit)
+            keep = (starts < time_limit) & (ends > starts)
+            if preview_only and preview_end:
+                # Preview mode only considers cues that start before the preview end
+                keep &= raw_starts < preview_end
+            starts, ends = starts.tolist(), ends.tolist()
+            if settings.get('shadow_enabled', False):
+                shadow_dx = int(settings.get('shadow_offset_x', 2))
+                shadow_dy = int(settings.get('shadow_offset_y', 2))
+            
+            # The position only varies with the rendered text size, and most
+            # cues share a line height and often a width, so memoize it
+            positions = {}
+            
+            # Each cue keeps its cached layers (shadow first) with their color
+            # and pixel position, blended straight into the frames below
+            cues = []
+            for i in np.flatnonzero(keep).tolist():
+                start_time, end_time = starts[i], ends[i]
+                
+                text_overlay, text_rgb, shadow_mask = self.render_subtitle_layers(
+                    subtitles_data[i]['text'], settings, arabic_processor
                 )
                 
                 # Set position based on settings and text dimensions
-                position = self.get_subtitle_position(settings, video_clip, sub_clip)
-                sub_clip = sub_clip.with_position(position)
+                text_size = (text_overlay.shape[1], text_overlay.shape[0])
+                position = positions.get(text_size)
+                if position is None:
+                    h_pos, v_pos = self.get_subtitle_position(settings, video_clip, text_size)
+                    position = positions[text_size] = (int(h_pos), int(v_pos))
+                x, y = position
                 
-                # Add shadow clip if present
-                if hasattr(sub_clip, 'has_shadow') and sub_clip.has_shadow and hasattr(sub_clip, 'shadow_clip'):
-                    shadow_clip = sub_clip.shadow_clip
-                    if shadow_clip:
-                        # Position shadow with offset
-                        shadow_offset = getattr(sub_clip, 'shadow_offset', (2, 2))
-                        
-                        # Calculate shadow position with offset
-                        shadow_pos = (
-                            position[0] + shadow_offset[0],
-                            position[1] + shadow_offset[1]
-                        )
-                        
-                        shadow_clip = shadow_clip.with_position(shadow_pos)
-                        subtitle_clips.append(shadow_clip)
+                layers = []
+                if shadow_mask is not None:
+                    layers.append((shadow_mask, (0, 0, 0), x + shadow_dx, y + shadow_dy))
+                layers.append((text_overlay, text_rgb, x, y))
+                cues.append((start_time, end_time, layers))
+            
+            if not cues:
+                return video_clip
+            
+            # Split the timeline at every cue start and end; each interval gets
+            # the layers of the cues covering it (overlaps included, in cue
+            # order), so a frame finds its layers with one binary search
+            boundaries = sorted({time for start, end, _ in cues for time in (start, end)})
+            segments = [[] for _ in range(len(boundaries) - 1)]
+            for start, end, layers in cues:
+                for segment in range(bisect.bisect_left(boundaries, start), bisect.bisect_left(boundaries, end)):
+                    segments[segment].extend(layers)
+            
+            def draw_subtitles(get_frame, t):
+                frame = get_frame(t)
+                segment = bisect.bisect_right(boundaries, t) - 1
+                if segment < 0 or segment >= len(segments) or not segments[segment]:
+                    return frame
                 
-                subtitle_clips.append(sub_clip)
+                # Decoded frames may be read-only, so blend into a copy
+                frame = np.array(frame, dtype=np.uint8)
+                for overlay, color, x, y in segments[segment]:
+                    if color is None:
+                        blend_rgba(frame, overlay, x, y)
+                    else:
+                        blend_mask(frame, overlay, color, x, y)
+                return frame
             
-            # Composite video with subtitles
-            if subtitle_clips:
-                final_clip = CompositeVideoClip([video_clip] + subtitle_clips)
-            else:
-                final_clip = video_clip
-            
-            return final_clip
+            return video_clip.transform(draw_subtitles)
             
         except Exception as e:
             raise Exception(f"Error applying subtitles: {str(e)}")
     
-    def get_subtitle_position(self, settings, video_clip, text_clip):
+    def get_subtitle_position(self, settings, video_clip, text_size):
         """
         Calculate subtitle position based on settings with proper handling for text height
         
         Args:
             settings (dict): Subtitle settings
             video_clip: Video clip for size reference
-            text_clip: Text clip to get dimensions from
+            text_size (tuple): Rendered text (width, height)
             
         Returns:
-            tuple: Position tuple (x, y) for MoviePy
+            tuple: Position tuple (x, y) in pixels
         """
         position_setting = settings.get('position', 'أسفل')
         alignment = settings.get('alignment', 'وسط')
@@ -409,8 +828,7 @@ class SubtitleRenderer:
         video_height = video_clip.h
         
         # Get text dimensions
-        text_width = text_clip.w
-        text_height = text_clip.h
+        text_width, text_height = text_size
         
         # Account for shadow offset if enabled
         shadow_enabled = settings.get('shadow_enabled', False)
@@ -457,17 +875,29 @@ class SubtitleRenderer:
             dict: Validation result
         """
         try:
-            with open(srt_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # Try to parse with pysrt
-            subs = pysrt.open(srt_path, encoding='utf-8')
+            # One read; decoding checks the encoding and the regex scan counts
+            # cues without building subtitle objects
+            data = Path(srt_path).read_bytes()
+            data.decode('utf-8-sig')
+            
+            texts = []
+            subtitle_count = 0
+            for m in _SRT_RE.finditer(data):
+                if subtitle_count < 5:
+                    texts.append(m.group(10).decode('utf-8'))
+                subtitle_count += 1
+            
+            if not subtitle_count and data.strip():
+                # Nothing matched the strict layout; let pysrt's tolerant parser count
+                subs = pysrt.from_string(data.decode('utf-8-sig'))
+                subtitle_count = len(subs)
+                texts = [sub.text for sub in subs[:5]]
             
             return {
                 'valid': True,
-                'subtitle_count': len(subs),
+                'subtitle_count': subtitle_count,
                 'encoding': 'utf-8',
-                'has_arabic': any('ا' in sub.text or 'ب' in sub.text for sub in subs[:5])
+                'has_arabic': bool(_ARABIC_RE.search('\n'.join(texts)))
             }
             
         except Exception as e:
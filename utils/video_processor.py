@@ -1,7 +1,128 @@
-from moviepy import VideoFileClip, AudioFileClip, CompositeVideoClip
+from moviepy import VideoFileClip
+from moviepy.config import FFMPEG_BINARY
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+import numpy as np
+import functools
+import subprocess
 import os
+import re
 import tempfile
-from pathlib import Path
+
+# Hardware H.264 encoders in order of preference
+HARDWARE_ENCODERS = ['h264_nvenc', 'h264_qsv', 'h264_vaapi', 'h264_videotoolbox']
+
+# Audio codecs the MP4 output can carry without re-encoding
+COPYABLE_AUDIO_CODECS = ('aac',)
+
+# Codec of the first audio stream in ffmpeg's input summary
+AUDIO_CODEC_PATTERN = re.compile(r'Stream #\d+:\d+.*?: Audio: (\w+)')
+
+# Encoder settings for previews, which favour speed over size
+PREVIEW_QUALITY = {'preset': 'fast', 'crf': 23}
+
+# Render node used by VAAPI (Intel/AMD on Linux)
+VAAPI_DEVICE = '/dev/dri/renderD128'
+
+# x264 speed presets mapped to the NVENC p1 (fastest) .. p7 (best) scale
+NVENC_PRESETS = {
+    'ultrafast': 'p1',
+    'superfast': 'p1',
+    'veryfast': 'p1',
+    'faster': 'p2',
+    'fast': 'p2',
+    'medium': 'p4',
+    'slow': 'p7',
+    'slower': 'p7',
+    'veryslow': 'p7'
+}
+
+def escape_filter_value(value):
+    """
+    Escape a value for use as an option inside an ffmpeg filtergraph
+    
+    Args:
+        value (str): Raw option value such as a file path
+        
+    Returns:
+        str: Value escaped for both the option and the filtergraph level
+    """
+    value = value.replace('\\', '\\\\').replace(':', '\\:').replace("'", "\\'")
+    return re.sub(r"([\\'\[\],;])", r'\\\1', value)
+
+def hardware_encoder_args(encoder):
+    """
+    Extra ffmpeg arguments a hardware encoder needs around the encode itself
+    
+    Args:
+        encoder (str): Hardware encoder name
+        
+    Returns:
+        tuple: (global_args placed before the inputs, filters appended to the video filter chain)
+    """
+    if encoder == 'h264_vaapi':
+        # Frames are uploaded to the GPU after the CPU-side filters (scale, subtitles)
+        return ['-vaapi_device', VAAPI_DEVICE], ['format=nv12', 'hwupload']
+    return [], []
+
+@functools.lru_cache(maxsize=256)
+def probe_audio_codec(audio_path, mtime_ns):
+    """
+    Read the codec of a file's first audio stream from its header
+    
+    Args:
+        audio_path (str): Path to audio file
+        mtime_ns (int): Modification time, so a replaced file is probed again
+        
+    Returns:
+        str: Codec name such as 'aac' or 'alac', or None if it can't be read
+    """
+    try:
+        # With no output file ffmpeg only prints the input summary (and exits non-zero)
+        result = subprocess.run(
+            [FFMPEG_BINARY, '-hide_banner', '-i', audio_path],
+            capture_output=True, text=True, timeout=30
+        )
+        match = AUDIO_CODEC_PATTERN.search(result.stderr)
+        return match.group(1).lower() if match else None
+    except Exception as e:
+        print(f"Error probing audio codec: {e}")
+        return None
+
+@functools.lru_cache(maxsize=None)
+def detect_hardware_encoder():
+    """
+    Find a hardware H.264 encoder that ffmpeg can actually use
+    
+    Returns:
+        str: Encoder name, or None to fall back to libx264
+    """
+    try:
+        result = subprocess.run(
+            [FFMPEG_BINARY, '-hide_banner', '-encoders'],
+            capture_output=True, text=True, timeout=10
+        )
+        
+        for encoder in HARDWARE_ENCODERS:
+            if encoder not in result.stdout:
+                continue
+            if encoder == 'h264_vaapi' and not os.path.exists(VAAPI_DEVICE):
+                continue
+            
+            # Encoders can be compiled in without a usable device, so try a tiny encode
+            global_args, filters = hardware_encoder_args(encoder)
+            probe = subprocess.run(
+                [FFMPEG_BINARY, '-hide_banner', '-loglevel', 'error', *global_args,
+                 '-f', 'lavfi', '-i', 'color=size=256x256:duration=0.1',
+                 *(['-vf', ','.join(filters)] if filters else []),
+                 '-c:v', encoder, '-f', 'null', '-'],
+                capture_output=True, timeout=30
+            )
+            if probe.returncode == 0:
+                return encoder
+    except Exception as e:
+        print(f"Error detecting hardware encoders: {e}")
+    
+    return None
 
 class VideoProcessor:
     """
@@ -11,6 +132,68 @@ class VideoProcessor:
     def __init__(self):
         pass
     
+    def get_encoder_settings(self, quality_settings, use_hardware=True):
+        """
+        Choose the video encoder and its parameters for a quality preset
+        
+        Args:
+            quality_settings (dict): Quality settings with 'preset', 'crf' and 'cq'
+            use_hardware (bool): Whether a detected hardware encoder may be used
+            
+        Returns:
+            tuple: (codec, global_args, extra_filters, ffmpeg_params) for the ffmpeg command
+        """
+        encoder = detect_hardware_encoder() if use_hardware else None
+        preset = quality_settings['preset']
+        cq = quality_settings.get('cq', quality_settings['crf'])
+        global_args, extra_filters = hardware_encoder_args(encoder)
+        
+        if encoder == 'h264_nvenc':
+            params = ['-preset', NVENC_PRESETS.get(preset, 'p4'), '-rc', 'vbr', '-cq', str(cq), '-b:v', '0', '-pix_fmt', 'yuv420p']
+        elif encoder == 'h264_qsv':
+            params = ['-preset', preset, '-global_quality', str(cq), '-pix_fmt', 'nv12']
+        elif encoder == 'h264_vaapi':
+            params = ['-qp', str(cq)]
+        elif encoder == 'h264_videotoolbox':
+            # VideoToolbox quality runs 1-100 with higher meaning better
+            params = ['-q:v', str(max(1, 100 - 2 * cq)), '-pix_fmt', 'yuv420p']
+        else:
+            encoder = 'libx264'
+            params = ['-preset', preset, '-crf', str(quality_settings['crf']), '-pix_fmt', 'yuv420p']
+        
+        return encoder, global_args, extra_filters, params
+    
+    def get_audio_args(self, audio_path, settings):
+        """
+        Build the ffmpeg arguments for a separate audio track, shared by the
+        previews and the export
+        
+        Args:
+            audio_path (str): Path to audio file (may be None)
+            settings (dict): Audio settings (audio_offset, audio_volume)
+            
+        Returns:
+            tuple: (input_args, filter_args, audio_codec); input_args is empty
+                when there is no audio file to add
+        """
+        if not (audio_path and os.path.exists(audio_path)):
+            return [], [], 'aac'
+        
+        # Apply audio offset
+        audio_offset = settings.get('audio_offset', 0)
+        input_args = ['-itsoffset', str(audio_offset), '-i', audio_path] if audio_offset else ['-i', audio_path]
+        
+        # Apply volume
+        audio_volume = settings.get('audio_volume', 1.0)
+        if audio_volume != 1.0:
+            return input_args, ['-af', f'volume={audio_volume}'], 'aac'
+        
+        # AAC can go into the MP4 as is; the offset only shifts timestamps. The
+        # codec is probed because an .m4a may just as well hold ALAC
+        if probe_audio_codec(audio_path, os.stat(audio_path).st_mtime_ns) in COPYABLE_AUDIO_CODECS:
+            return input_args, [], 'copy'
+        return input_args, [], 'aac'
+    
     def get_video_info(self, video_path):
         """
         Extract video file information
@@ -22,20 +205,23 @@ class VideoProcessor:
             dict: Video information
         """
         try:
-            with VideoFileClip(video_path) as clip:
-                info = {
-                    'duration': clip.duration,
-                    'fps': clip.fps,
-                    'width': clip.w,
-                    'height': clip.h,
-                    'size': os.path.getsize(video_path) / (1024 * 1024)  # MB
-                }
+            # Read the container header only; no decoder pipe is started
+            infos = ffmpeg_parse_infos(video_path)
+            width, height = infos['video_size']
+            info = {
+                'duration': infos['duration'],
+                'fps': infos['video_fps'],
+                'width': width,
+                'height': height,
+                'size': os.path.getsize(video_path) / (1024 * 1024)  # MB
+            }
             return info
         except Exception as e:
             raise Exception(f"Error reading video info: {str(e)}")
     
     def create_preview(self, video_path, subtitles_data, audio_path, settings, 
-                      arabic_processor, subtitle_renderer, preview_duration=30):
+                      arabic_processor, subtitle_renderer, preview_duration=30, output_dir=None,
+                      use_hardware=True):
         """
         Create a preview video with subtitles and audio
         
@@ -47,17 +233,23 @@ class VideoProcessor:
             arabic_processor: Arabic text processor instance
             subtitle_renderer: Subtitle renderer instance
             preview_duration (int): Duration of preview in seconds
+            output_dir (str, optional): Directory for the preview file
+            use_hardware (bool): Whether a detected hardware encoder may be used
             
         Returns:
             str: Path to preview video
         """
+        # Clips opened so far, closed whether or not the render succeeds
+        clips = []
         try:
             # Load video clip
             video_clip = VideoFileClip(video_path)
+            clips.append(video_clip)
             
             # Create preview clip (first 30 seconds or less)
             preview_end = min(preview_duration, video_clip.duration)
             video_preview = video_clip.subclipped(0, preview_end)
+            clips.append(video_preview)
             
             # Apply subtitle rendering
             video_with_subs = subtitle_renderer.apply_subtitles(
@@ -68,54 +260,129 @@ class VideoProcessor:
                 preview_only=True,
                 preview_end=preview_end
             )
+            if video_with_subs is not video_preview:
+                clips.append(video_with_subs)
             
-            # Handle audio if provided
-            if audio_path and os.path.exists(audio_path):
-                audio_clip = AudioFileClip(audio_path)
-                
-                # Apply audio offset
-                audio_offset = settings.get('audio_offset', 0)
-                if audio_offset != 0:
-                    audio_clip = audio_clip.with_start(audio_offset)
-                
-                # Apply volume
-                audio_volume = settings.get('audio_volume', 1.0)
-                if audio_volume != 1.0:
-                    audio_clip = audio_clip.volumex(audio_volume)
-                
-                # Trim audio to preview duration
-                audio_clip = audio_clip.subclipped(0, preview_end)
+            # Create temporary file for preview
+            preview_path = tempfile.mktemp(suffix='_preview.mp4', dir=output_dir)
+            fps = video_preview.fps
+            width, height = video_with_subs.size
+            
+            codec, global_args, extra_filters, ffmpeg_params = self.get_encoder_settings(PREVIEW_QUALITY, use_hardware)
+            
+            # Composited frames go straight into ffmpeg's stdin; audio is read by
+            # ffmpeg from its source file, so nothing is staged on disk. With no
+            # cue in the preview window there is nothing to draw, and ffmpeg
+            # decodes the video file itself instead
+            pipe_frames = video_with_subs is not video_preview
+            if pipe_frames:
+                video_input = ['-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{width}x{height}', '-r', str(fps), '-i', '-']
+            else:
+                video_input = ['-i', video_path]
+            cmd = [FFMPEG_BINARY, '-y', '-hide_banner', '-loglevel', 'error', *global_args, *video_input]
+            
+            # Use the separate audio file if provided, else the video's own track
+            audio_inputs, audio_filters, audio_codec = self.get_audio_args(audio_path, settings)
+            cmd += (audio_inputs or ['-i', video_path]) + audio_filters
+            
+            if extra_filters:
+                cmd += ['-vf', ','.join(extra_filters)]
+            
+            # Trim audio to preview duration
+            cmd += ['-map', '0:v:0', '-map', '1:a:0?',
+                    '-c:v', codec, *ffmpeg_params,
+                    '-c:a', audio_codec, '-t', str(preview_end), '-movflags', '+faststart', preview_path]
+            
+            # Write preview video. stderr goes to a file rather than a pipe, so
+            # ffmpeg can never block on it while we are still writing frames
+            with tempfile.TemporaryFile() as stderr_file:
+                process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=stderr_file, bufsize=1 << 20)
+                try:
+                    if pipe_frames:
+                        for frame in video_with_subs.iter_frames(fps=fps, dtype='uint8'):
+                            process.stdin.write(np.ascontiguousarray(frame).data)
+                except BrokenPipeError:
+                    pass  # ffmpeg exited early; its error is reported below
+                except BaseException:
+                    # Frame rendering failed; don't leave ffmpeg running or unreaped
+                    process.kill()
+                    process.wait()
+                    raise
+                finally:
+                    try:
+                        process.stdin.close()
+                    except BrokenPipeError:
+                        pass
                 
-                # Set audio to video
-                video_with_subs = video_with_subs.with_audio(audio_clip)
-                audio_clip.close()
+                if process.wait() != 0:
+                    stderr_file.seek(0)
+                    stderr = stderr_file.read().decode(errors='replace')
+                    raise Exception(stderr.strip() or f"ffmpeg exited with code {process.returncode}")
             
-            # Create temporary file for preview
-            preview_path = tempfile.mktemp(suffix='_preview.mp4')
-            
-            # Write preview video
-            video_with_subs.write_videofile(
-                preview_path,
-                fps=video_preview.fps,
-                codec='libx264',
-                audio_codec='aac',
-                preset='fast'
-            )
+            return preview_path
             
+        except Exception as e:
+            raise Exception(f"Error creating preview: {str(e)}")
+        finally:
             # Cleanup
-            video_clip.close()
-            video_preview.close()
-            video_with_subs.close()
+            for clip in reversed(clips):
+                clip.close()
+    
+    def create_quick_preview(self, video_path, subtitles_data, audio_path, settings, 
+                            arabic_processor, subtitle_renderer, preview_duration=30, output_dir=None):
+        """
+        Create a preview without re-encoding the video stream; subtitles are
+        written next to it as a WebVTT track for the browser to display
+        
+        Args:
+            video_path (str): Path to original video
+            subtitles_data (list): List of subtitle entries
+            audio_path (str): Path to audio file
+            settings (dict): Subtitle and audio settings
+            arabic_processor: Arabic text processor instance
+            subtitle_renderer: Subtitle renderer instance
+            preview_duration (int): Duration of preview in seconds
+            output_dir (str, optional): Directory for the preview files
+            
+        Returns:
+            str: Path to preview video (the track is the same path with .vtt)
+        """
+        try:
+            preview_path = tempfile.mktemp(suffix='_preview.mp4', dir=output_dir)
+            subtitle_renderer.to_vtt(
+                subtitles_data, settings, arabic_processor,
+                output_path=os.path.splitext(preview_path)[0] + '.vtt'
+            )
+            
+            cmd = [FFMPEG_BINARY, '-y', '-hide_banner', '-loglevel', 'error',
+                   '-t', str(preview_duration), '-i', video_path]
+            
+            # Handle audio if provided
+            audio_inputs, audio_filters, audio_codec = self.get_audio_args(audio_path, settings)
+            if audio_inputs:
+                cmd += audio_inputs + ['-map', '0:v:0', '-map', '1:a:0'] + audio_filters
+            else:
+                cmd += ['-map', '0:v:0', '-map', '0:a?']
+            
+            # Copy the video stream as-is; at most the audio is encoded
+            cmd += ['-c:v', 'copy', '-c:a', audio_codec, '-t', str(preview_duration),
+                    '-movflags', '+faststart', preview_path]
+            
+            result = subprocess.run(cmd, capture_output=True, text=True)
+            if result.returncode != 0:
+                raise Exception(result.stderr.strip() or f"ffmpeg exited with code {result.returncode}")
             
             return preview_path
             
         except Exception as e:
-            raise Exception(f"Error creating preview: {str(e)}")
+            raise Exception(f"Error creating quick preview: {str(e)}")
     
     def export_final_video(self, video_path, subtitles_data, audio_path, settings, 
-                          arabic_processor, subtitle_renderer, output_filename, quality_settings, target_resolution=None):
+                          arabic_processor, subtitle_renderer, output_filename, quality_settings, target_resolution=None,
+                          use_hardware=True):
         """
-        Export final video with subtitles and audio
+        Export final video with subtitles and audio, burning the subtitles in
+        with ffmpeg's subtitles filter so frames never pass through Python
         
         Args:
             video_path (str): Path to original video
@@ -125,77 +392,74 @@ class VideoProcessor:
             arabic_processor: Arabic text processor instance
             subtitle_renderer: Subtitle renderer instance
             output_filename (str): Output filename without extension
-            quality_settings (dict): Quality settings for encoding
+            quality_settings (dict): Quality settings for encoding (preset, crf, cq)
             target_resolution (int, optional): Target video height (e.g., 1080, 720)
+            use_hardware (bool): Whether a detected hardware encoder may be used
             
         Returns:
             str: Path to final video
         """
+        ass_path = None
         try:
-            # Load video clip
-            video_clip = VideoFileClip(video_path)
+            video_info = self.get_video_info(video_path)
+            width, height = video_info['width'], video_info['height']
+            video_filters = []
             
             # Resize video if target resolution is specified
-            if target_resolution and target_resolution != video_clip.h:
-                aspect_ratio = video_clip.w / video_clip.h
+            if target_resolution and target_resolution != height:
+                aspect_ratio = width / height
                 new_width = int(target_resolution * aspect_ratio)
                 # Ensure even dimensions for codec compatibility
-                new_width = new_width if new_width % 2 == 0 else new_width + 1
-                new_height = target_resolution if target_resolution % 2 == 0 else target_resolution + 1
-                video_clip = video_clip.resized(height=new_height)
+                width = new_width if new_width % 2 == 0 else new_width + 1
+                height = target_resolution if target_resolution % 2 == 0 else target_resolution + 1
+                video_filters.append(f"scale={width}:{height}")
             
-            # Apply subtitle rendering
-            video_with_subs = subtitle_renderer.apply_subtitles(
-                video_clip, 
-                subtitles_data, 
-                settings, 
-                arabic_processor,
-                preview_only=False
+            # Render subtitles to ASS at the output size and let libass draw them
+            ass_path = subtitle_renderer.to_ass(subtitles_data, settings, arabic_processor, (width, height))
+            fonts_dir = os.path.join(os.getcwd(), "assets/fonts")
+            video_filters.append(
+                f"subtitles={escape_filter_value(ass_path)}:fontsdir={escape_filter_value(fonts_dir)}"
             )
             
+            codec, global_args, extra_filters, ffmpeg_params = self.get_encoder_settings(quality_settings, use_hardware)
+            video_filters += extra_filters
+            
+            cmd = [FFMPEG_BINARY, '-y', '-hide_banner', '-loglevel', 'error', *global_args, '-i', video_path]
+            
             # Handle audio if provided
-            if audio_path and os.path.exists(audio_path):
-                audio_clip = AudioFileClip(audio_path)
-                
-                # Apply audio offset
-                audio_offset = settings.get('audio_offset', 0)
-                if audio_offset != 0:
-                    audio_clip = audio_clip.with_start(audio_offset)
-                
-                # Apply volume
-                audio_volume = settings.get('audio_volume', 1.0)
-                if audio_volume != 1.0:
-                    audio_clip = audio_clip.volumex(audio_volume)
-                
-                # Ensure audio duration matches video
-                if audio_clip.duration > video_with_subs.duration:
-                    audio_clip = audio_clip.subclipped(0, video_with_subs.duration)
-                
-                # Set audio to video
-                video_with_subs = video_with_subs.with_audio(audio_clip)
-                audio_clip.close()
+            audio_inputs, audio_filters, audio_codec = self.get_audio_args(audio_path, settings)
+            if audio_inputs:
+                cmd += audio_inputs + ['-map', '0:v:0', '-map', '1:a:0'] + audio_filters
+            else:
+                cmd += ['-map', '0:v:0', '-map', '0:a?']
             
-            # Create output path
+            # Create output path; encode to a partial file and rename it into
+            # place so a failed export never leaves a truncated video behind
             output_path = f"{output_filename}.mp4"
+            partial_path = f"{output_filename}.partial.mp4"
             
-            # Write final video with quality settings
-            video_with_subs.write_videofile(
-                output_path,
-                fps=video_clip.fps,
-                codec='libx264',
-                audio_codec='aac',
-                preset=quality_settings['preset'],
-                ffmpeg_params=['-crf', str(quality_settings['crf'])]
-            )
+            # Keep the video length; longer audio is cut at the end of the video
+            cmd += ['-vf', ','.join(video_filters),
+                    '-c:v', codec, *ffmpeg_params,
+                    '-c:a', audio_codec, '-t', str(video_info['duration']),
+                    '-movflags', '+faststart', partial_path]
             
-            # Cleanup
-            video_clip.close()
-            video_with_subs.close()
+            result = subprocess.run(cmd, capture_output=True, text=True)
+            if result.returncode != 0:
+                if os.path.exists(partial_path):
+                    os.unlink(partial_path)
+                raise Exception(result.stderr.strip() or f"ffmpeg exited with code {result.returncode}")
             
+            os.replace(partial_path, output_path)
             return output_path
             
         except Exception as e:
             raise Exception(f"Error exporting video: {str(e)}")
+        
+        finally:
+            # Cleanup
+            if ass_path and os.path.exists(ass_path):
+                os.unlink(ass_path)
     
     def get_frame_at_time(self, video_path, time_seconds):
         """
@@ -1,7 +1,101 @@
 import yt_dlp
+import asyncio
+import concurrent.futures
+import contextlib
+import copy
+import fnmatch
 import os
-import tempfile
-from pathlib import Path
+import re
+import threading
+import time
+
+# Extracted video info is reused for this many seconds
+INFO_CACHE_TTL = 10 * 60
+
+# Failed extractions are reported again without a network call for this many seconds
+FAILED_INFO_TTL = 60
+
+# Most videos whose info (or failure) is kept at once
+INFO_CACHE_SIZE = 512
+
+# Format selector for 'best': MP4 video with M4A audio, else the best single MP4
+BEST_MP4_FORMAT = 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best'
+
+# VTT cue timestamp split into hours (optional), minutes, seconds and fraction
+VTT_TIMESTAMP_PATTERN = re.compile(r'(?:(\d+):)?(\d{2}):(\d{2})[.,](\d+)')
+
+# VTT cue timing line: start --> end, optionally followed by cue settings
+VTT_CUE_TIMING_PATTERN = re.compile(r'((?:\d+:)?\d{2}:\d{2}\.\d+)[ \t]+-->[ \t]+((?:\d+:)?\d{2}:\d{2}\.\d+)')
+
+# Inline cue tags such as <c>, <i> and karaoke timestamps
+VTT_TAG_PATTERN = re.compile(r'<[^>]*>')
+
+# Subtitle formats offered to the user, first match per language wins
+SUBTITLE_EXTENSIONS = ('vtt', 'srt')
+
+# DASH fragments fetched at once; 2 is gentler behind a shared IP
+DOWNLOAD_FRAGMENT_WORKERS = 4
+
+# Non-fragmented formats are fetched in ranged requests of this size
+DOWNLOAD_CHUNK_SIZE = 10 * 1024 * 1024
+
+# Downloads kept on disk before the oldest are deleted
+DOWNLOADS_MAX_BYTES = 2 * 1024 ** 3
+
+# Files this recent may belong to a download still in progress and are never pruned
+DOWNLOADS_GRACE_SECONDS = 10 * 60
+
+# yt-dlp's in-progress files: partial downloads, fragments and resume state
+IN_PROGRESS_PATTERNS = ('*.part', '*.part-Frag*', '*.ytdl', '*.frag*', '*.temp.*')
+
+# Most idle YoutubeDL instances kept open between calls
+YDL_POOL_SIZE = 8
+
+# 11-character video ID in watch, short, embed, live and youtu.be URLs
+YOUTUBE_ID_PATTERN = re.compile(r'(?:youtube\.com/(?:watch\?(?:[^#]*&)?v=|shorts/|embed/|live/)|youtu\.be/)([\w-]{11})')
+
+def canonical_video_key(url):
+    """
+    Reduce a YouTube URL to its video ID so timestamps, playlist and tracking
+    parameters don't create separate cache entries
+    
+    Args:
+        url (str): Video URL
+        
+    Returns:
+        str: Video ID, or the stripped URL for anything else
+    """
+    m = YOUTUBE_ID_PATTERN.search(url)
+    return m.group(1) if m else url.strip()
+
+def ffmpeg_location():
+    """
+    ffmpeg binary the rest of the app uses (moviepy's imageio-ffmpeg), so
+    yt-dlp's postprocessors don't depend on a system ffmpeg on PATH; moviepy
+    is imported only once a download needs it
+    
+    Returns:
+        str: Path to the ffmpeg executable
+    """
+    from moviepy.config import FFMPEG_BINARY
+    return FFMPEG_BINARY
+
+def find_first_file(directory, pattern):
+    """
+    Find the first file in a directory whose name matches a glob pattern
+    
+    Args:
+        directory (str): Directory to search (not recursive)
+        pattern (str): Shell-style pattern, e.g. '*ar*.srt'
+        
+    Returns:
+        str: Path to the matching file, or None
+    """
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if fnmatch.fnmatch(entry.name, pattern):
+                return entry.path
+    return None
 
 class YouTubeDownloader:
     """
@@ -11,6 +105,75 @@ class YouTubeDownloader:
     def __init__(self):
         self.output_dir = os.path.join(os.getcwd(), 'youtube_downloads')
         os.makedirs(self.output_dir, exist_ok=True)
+        # Video info keyed by video ID: (monotonic time, info); shared by sessions
+        self.info_cache = {}
+        # Recent extraction failures keyed by video ID: (monotonic time, error message)
+        self.failed_cache = {}
+        self.cache_lock = threading.Lock()
+        # Idle YoutubeDL instances keyed by their options, least recently used first
+        self.ydl_pool = {}
+    
+    @contextlib.contextmanager
+    def get_ydl(self, ydl_opts, progress_hooks=()):
+        """
+        Check out a YoutubeDL for a set of options, reusing an idle one so its
+        HTTP connections stay open between calls; a new one is created when
+        none is free, so concurrent callers never wait on each other
+        
+        Args:
+            ydl_opts (dict): yt-dlp options (without progress_hooks)
+            progress_hooks (list): Hooks attached for this checkout only, so a
+                pooled instance never keeps a finished caller's callbacks alive
+            
+        Yields:
+            YoutubeDL: Instance owned by the caller until the block exits
+        """
+        key = repr(sorted(ydl_opts.items()))
+        
+        with self.cache_lock:
+            idle = self.ydl_pool.get(key)
+            ydl = idle.pop() if idle else None
+        if ydl is None:
+            ydl = yt_dlp.YoutubeDL(ydl_opts)
+        
+        for hook in progress_hooks:
+            ydl.add_progress_hook(hook)
+        
+        try:
+            yield ydl
+        finally:
+            for hook in progress_hooks:
+                ydl._progress_hooks.remove(hook)
+            
+            evicted = []
+            with self.cache_lock:
+                # Re-insert so the pool's order runs from least to most recently used
+                idle = self.ydl_pool.pop(key, [])
+                idle.append(ydl)
+                self.ydl_pool[key] = idle
+                
+                idle_count = sum(len(instances) for instances in self.ydl_pool.values())
+                while idle_count > YDL_POOL_SIZE:
+                    oldest = self.ydl_pool[next(iter(self.ydl_pool))]
+                    evicted.append(oldest.pop(0))
+                    if not oldest:
+                        self.ydl_pool.pop(next(iter(self.ydl_pool)))
+                    idle_count -= 1
+            
+            # Idle instances belong to nobody, so they can be closed outside the lock
+            for instance in evicted:
+                instance.close()
+    
+    def close(self):
+        """
+        Close every idle pooled YoutubeDL instance
+        """
+        with self.cache_lock:
+            entries = [ydl for instances in self.ydl_pool.values() for ydl in instances]
+            self.ydl_pool.clear()
+        
+        for ydl in entries:
+            ydl.close()
     
     def get_video_info(self, url):
         """
@@ -22,59 +185,68 @@ class YouTubeDownloader:
         Returns:
             dict: Video information including available formats and subtitles
         """
+        cache_key = canonical_video_key(url)
+        with self.cache_lock:
+            cached = self.info_cache.get(cache_key)
+            failed = self.failed_cache.get(cache_key)
+        if cached and time.monotonic() - cached[0] < INFO_CACHE_TTL:
+            return copy.deepcopy(cached[1])
+        # Geo-blocked, removed or age-gated videos fail the same way on retry
+        if failed and time.monotonic() - failed[0] < FAILED_INFO_TTL:
+            raise Exception(failed[1])
+        
         ydl_opts = {
             'quiet': True,
             'no_warnings': True,
+            # Listing formats doesn't need each one probed for availability
+            'check_formats': False,
         }
         
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            with self.get_ydl(ydl_opts) as ydl:
                 info = ydl.extract_info(url, download=False)
                 
-                formats = []
-                seen_qualities = set()
-                
-                for fmt in info.get('formats', []):
-                    if fmt.get('vcodec') != 'none' and fmt.get('acodec') != 'none':
-                        height = fmt.get('height', 0)
-                        if height and height not in seen_qualities:
-                            quality_label = f"{height}p"
-                            formats.append({
-                                'format_id': fmt['format_id'],
-                                'quality': quality_label,
-                                'height': height,
-                                'ext': fmt.get('ext', 'mp4'),
-                                'filesize': fmt.get('filesize', 0)
-                            })
-                            seen_qualities.add(height)
-                
-                formats.sort(key=lambda x: x['height'], reverse=True)
+                # First muxed (video + audio) format listed for each height
+                by_height = {}
+                for fmt in info.get('formats') or ():
+                    if fmt.get('vcodec') == 'none' or fmt.get('acodec') == 'none':
+                        continue
+                    height = fmt.get('height')
+                    if height and height not in by_height:
+                        by_height[height] = fmt
+                
+                formats = [
+                    {
+                        'format_id': fmt['format_id'],
+                        'quality': f"{height}p",
+                        'height': height,
+                        'ext': fmt.get('ext', 'mp4'),
+                        'filesize': fmt.get('filesize', 0)
+                    }
+                    for height, fmt in sorted(by_height.items(), reverse=True)
+                ]
                 
                 subtitles = []
-                if 'subtitles' in info:
-                    for lang, subs in info['subtitles'].items():
-                        for sub in subs:
-                            if sub.get('ext') in ['vtt', 'srt']:
-                                subtitles.append({
-                                    'lang': lang,
-                                    'ext': sub['ext'],
-                                    'name': f"{lang} ({sub['ext'].upper()})"
-                                })
-                                break
+                for lang, subs in (info.get('subtitles') or {}).items():
+                    sub = next((sub for sub in subs if sub.get('ext') in SUBTITLE_EXTENSIONS), None)
+                    if sub:
+                        subtitles.append({
+                            'lang': lang,
+                            'ext': sub['ext'],
+                            'name': f"{lang} ({sub['ext'].upper()})"
+                        })
                 
                 automatic_captions = []
-                if 'automatic_captions' in info:
-                    for lang, subs in info['automatic_captions'].items():
-                        for sub in subs:
-                            if sub.get('ext') in ['vtt', 'srt']:
-                                automatic_captions.append({
-                                    'lang': lang,
-                                    'ext': sub['ext'],
-                                    'name': f"{lang} (تلقائية - {sub['ext'].upper()})"
-                                })
-                                break
-                
-                return {
+                for lang, subs in (info.get('automatic_captions') or {}).items():
+                    sub = next((sub for sub in subs if sub.get('ext') in SUBTITLE_EXTENSIONS), None)
+                    if sub:
+                        automatic_captions.append({
+                            'lang': lang,
+                            'ext': sub['ext'],
+                            'name': f"{lang} (تلقائية - {sub['ext'].upper()})"
+                        })
+                
+                video_info = {
                     'title': info.get('title', 'Unknown'),
                     'duration': info.get('duration', 0),
                     'thumbnail': info.get('thumbnail', ''),
@@ -85,7 +257,106 @@ class YouTubeDownloader:
                 }
                 
         except Exception as e:
-            raise Exception(f"خطأ في جلب معلومات الفيديو: {str(e)}")
+            message = f"خطأ في جلب معلومات الفيديو: {str(e)}"
+            with self.cache_lock:
+                self.failed_cache.pop(cache_key, None)
+                if len(self.failed_cache) >= INFO_CACHE_SIZE:
+                    self.failed_cache.pop(next(iter(self.failed_cache)))
+                self.failed_cache[cache_key] = (time.monotonic(), message)
+            raise Exception(message)
+        
+        with self.cache_lock:
+            self.failed_cache.pop(cache_key, None)
+            self.info_cache.pop(cache_key, None)
+            if len(self.info_cache) >= INFO_CACHE_SIZE:
+                # Dicts keep insertion order, so the first entry is the oldest
+                self.info_cache.pop(next(iter(self.info_cache)))
+            self.info_cache[cache_key] = (time.monotonic(), video_info)
+        
+        return copy.deepcopy(video_info)
+    
+    def get_video_info_batch(self, urls, max_workers=4):
+        """
+        Get information for several videos at once, extracting in parallel
+        
+        Args:
+            urls (list): YouTube video URLs
+            max_workers (int): Most extractions in flight; lower it (e.g. 2)
+                when many requests from one IP get rate-limited
+            
+        Returns:
+            list: Video information for each URL, in the same order
+        """
+        urls = list(urls)
+        if not urls:
+            return []
+        
+        max_workers = max(1, min(max_workers, len(urls)))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(self.get_video_info, urls))
+    
+    def forget_video_info(self, url):
+        """
+        Drop cached info for a video, e.g. after a failed download
+        
+        Args:
+            url (str): YouTube video URL
+        """
+        with self.cache_lock:
+            self.info_cache.pop(canonical_video_key(url), None)
+    
+    def forget_failure(self, url):
+        """
+        Drop a cached extraction failure for a video, e.g. after it downloaded fine
+        
+        Args:
+            url (str): YouTube video URL
+        """
+        with self.cache_lock:
+            self.failed_cache.pop(canonical_video_key(url), None)
+    
+    def prune_downloads(self, keep=()):
+        """
+        Delete the least recently modified downloads once the output directory
+        grows past DOWNLOADS_MAX_BYTES. The directory is shared, so the caller
+        passes every path a live session may still be using
+        
+        Args:
+            keep (iterable): Paths that must not be deleted (files in use, the file just downloaded)
+        """
+        files = []
+        total = 0
+        grace_cutoff = time.time() - DOWNLOADS_GRACE_SECONDS
+        with os.scandir(self.output_dir) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                # Downloads still being written count only once yt-dlp finalizes them
+                if any(fnmatch.fnmatch(entry.name, pattern) for pattern in IN_PROGRESS_PATTERNS):
+                    continue
+                stat = entry.stat()
+                total += stat.st_size
+                # Recent files count toward the budget but may still be in use by a
+                # running download (e.g. subtitles written before its video), so keep them
+                if stat.st_mtime < grace_cutoff:
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+        
+        if total <= DOWNLOADS_MAX_BYTES:
+            return
+        
+        keep = {os.path.abspath(path) for path in keep}
+        files.sort()
+        for mtime, size, path in files:
+            if total <= DOWNLOADS_MAX_BYTES:
+                break
+            if os.path.abspath(path) in keep:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                # Already removed by another session, or still open
+                pass
     
     def download_video(self, url, quality='best', progress_callback=None):
         """
@@ -102,31 +373,95 @@ class YouTubeDownloader:
         output_template = os.path.join(self.output_dir, '%(title)s.%(ext)s')
         
         ydl_opts = {
-            'format': quality if quality != 'best' else 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best',
+            'format': quality if quality != 'best' else BEST_MP4_FORMAT,
             'outtmpl': output_template,
             'merge_output_format': 'mp4',
+            'concurrent_fragment_downloads': DOWNLOAD_FRAGMENT_WORKERS,
+            'http_chunk_size': DOWNLOAD_CHUNK_SIZE,
             'quiet': True,
             'no_warnings': True,
         }
         
-        if progress_callback:
-            ydl_opts['progress_hooks'] = [progress_callback]
+        # Per-call hooks are attached at checkout, so they don't split the pool
+        progress_hooks = [progress_callback] if progress_callback else []
         
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            with self.get_ydl(ydl_opts, progress_hooks) as ydl:
                 info = ydl.extract_info(url, download=True)
-                filename = ydl.prepare_filename(info)
                 
-                if not os.path.exists(filename):
-                    possible_files = list(Path(self.output_dir).glob(f"{info['title']}.*"))
-                    if possible_files:
-                        filename = str(possible_files[0])
+                # yt-dlp reports the final (post-merge) path
+                downloads = info.get('requested_downloads') or [{}]
+                filename = downloads[0].get('filepath') or ydl.prepare_filename(info)
                 
-                return filename
+                if not os.path.exists(filename):
+                    filename = find_first_file(self.output_dir, f"{info['title']}.*") or filename
+            
+            self.forget_failure(url)
+            return filename
                 
         except Exception as e:
+            # The formats listed for this video may be stale
+            self.forget_video_info(url)
             raise Exception(f"خطأ في تحميل الفيديو: {str(e)}")
     
+    def download_video_with_subs(self, url, quality='best', lang='ar', subtitle_type='subtitles',
+                                 progress_callback=None):
+        """
+        Download a video and one subtitle track in a single yt-dlp run, so the
+        video page is extracted once and both files share its connections
+        
+        Args:
+            url (str): YouTube video URL
+            quality (str): Quality format ID or 'best'
+            lang (str): Language code (e.g., 'ar', 'en')
+            subtitle_type (str): 'subtitles' or 'automatic_captions'
+            progress_callback: Callback function for progress updates
+            
+        Returns:
+            tuple: (path to video file, path to SRT subtitle file)
+        """
+        output_template = os.path.join(self.output_dir, '%(title)s.%(ext)s')
+        
+        ydl_opts = {
+            'format': quality if quality != 'best' else BEST_MP4_FORMAT,
+            'outtmpl': output_template,
+            'merge_output_format': 'mp4',
+            'concurrent_fragment_downloads': DOWNLOAD_FRAGMENT_WORKERS,
+            'http_chunk_size': DOWNLOAD_CHUNK_SIZE,
+            'writesubtitles': subtitle_type == 'subtitles',
+            'writeautomaticsub': subtitle_type == 'automatic_captions',
+            'subtitleslangs': [lang],
+            'subtitlesformat': 'srt/vtt/best',
+            # ffmpeg converts whatever was served to SRT before the video downloads
+            'postprocessors': [{'key': 'FFmpegSubtitlesConvertor', 'format': 'srt', 'when': 'before_dl'}],
+            # Same ffmpeg the rest of the app uses (imageio-ffmpeg), not whatever is on PATH
+            'ffmpeg_location': ffmpeg_location(),
+            'quiet': True,
+            'no_warnings': True,
+        }
+        
+        # Per-call hooks are attached at checkout, so they don't split the pool
+        progress_hooks = [progress_callback] if progress_callback else []
+        
+        try:
+            with self.get_ydl(ydl_opts, progress_hooks) as ydl:
+                info = ydl.extract_info(url, download=True)
+                
+                # yt-dlp reports where each file ended up
+                downloads = info.get('requested_downloads') or [{}]
+                video_path = downloads[0].get('filepath') or ydl.prepare_filename(info)
+                subtitle_path = ((info.get('requested_subtitles') or {}).get(lang) or {}).get('filepath')
+                
+                if not subtitle_path or not os.path.exists(subtitle_path):
+                    raise Exception(f"لم يتم العثور على ترجمة بلغة {lang}")
+            
+            self.forget_failure(url)
+            return video_path, subtitle_path
+                
+        except Exception as e:
+            self.forget_video_info(url)
+            raise Exception(f"خطأ في تحميل الفيديو مع الترجمة: {str(e)}")
+    
     def download_subtitle(self, url, lang='ar', subtitle_type='subtitles'):
         """
         Download subtitle from YouTube
@@ -146,16 +481,23 @@ class YouTubeDownloader:
             'writesubtitles': subtitle_type == 'subtitles',
             'writeautomaticsub': subtitle_type == 'automatic_captions',
             'subtitleslangs': [lang],
-            'subtitlesformat': 'srt',
+            'subtitlesformat': 'srt/vtt/best',
+            # YouTube mostly serves VTT; ffmpeg converts it to SRT in one pass
+            'postprocessors': [{'key': 'FFmpegSubtitlesConvertor', 'format': 'srt', 'when': 'before_dl'}],
+            'ffmpeg_location': ffmpeg_location(),
             'outtmpl': output_template,
             'quiet': True,
             'no_warnings': True,
         }
         
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            with self.get_ydl(ydl_opts) as ydl:
                 info = ydl.extract_info(url, download=True)
                 
+                subtitle_file = ((info.get('requested_subtitles') or {}).get(lang) or {}).get('filepath')
+                if subtitle_file and subtitle_file.endswith('.srt') and os.path.exists(subtitle_file):
+                    return subtitle_file
+                
                 base_filename = ydl.prepare_filename(info).rsplit('.', 1)[0]
                 subtitle_file = f"{base_filename}.{lang}.srt"
                 
@@ -166,19 +508,60 @@ class YouTubeDownloader:
                     if os.path.exists(vtt_file):
                         return self._convert_vtt_to_srt(vtt_file)
                     
-                    possible_subs = list(Path(self.output_dir).glob(f"*{lang}*.srt"))
-                    if possible_subs:
-                        return str(possible_subs[0])
+                    possible_sub = find_first_file(self.output_dir, f"*{lang}*.srt")
+                    if possible_sub:
+                        return possible_sub
                     
-                    possible_vtt = list(Path(self.output_dir).glob(f"*{lang}*.vtt"))
+                    possible_vtt = find_first_file(self.output_dir, f"*{lang}*.vtt")
                     if possible_vtt:
-                        return self._convert_vtt_to_srt(str(possible_vtt[0]))
+                        return self._convert_vtt_to_srt(possible_vtt)
                     
                     raise Exception(f"لم يتم العثور على ترجمة بلغة {lang}")
                 
         except Exception as e:
+            self.forget_video_info(url)
             raise Exception(f"خطأ في تحميل الترجمة: {str(e)}")
     
+    async def aget_video_info(self, url):
+        """
+        Async variant of get_video_info; extraction runs in a worker thread
+        
+        Args:
+            url (str): YouTube video URL
+            
+        Returns:
+            dict: Video information including available formats and subtitles
+        """
+        return await asyncio.to_thread(self.get_video_info, url)
+    
+    async def adownload_video(self, url, quality='best', progress_callback=None):
+        """
+        Async variant of download_video; the download runs in a worker thread
+        
+        Args:
+            url (str): YouTube video URL
+            quality (str): Quality format ID or 'best'
+            progress_callback: Callback function for progress updates (called from the worker thread)
+            
+        Returns:
+            str: Path to downloaded video file
+        """
+        return await asyncio.to_thread(self.download_video, url, quality, progress_callback)
+    
+    async def adownload_subtitle(self, url, lang='ar', subtitle_type='subtitles'):
+        """
+        Async variant of download_subtitle; the download runs in a worker thread
+        
+        Args:
+            url (str): YouTube video URL
+            lang (str): Language code (e.g., 'ar', 'en')
+            subtitle_type (str): 'subtitles' or 'automatic_captions'
+            
+        Returns:
+            str: Path to downloaded subtitle file
+        """
+        return await asyncio.to_thread(self.download_subtitle, url, lang, subtitle_type)
+    
     def _convert_vtt_to_srt(self, vtt_path):
         """
         Convert VTT subtitle to SRT format
@@ -189,37 +572,42 @@ class YouTubeDownloader:
         Returns:
             str: Path to SRT file
         """
-        import webvtt
-        import pysrt
-        
         srt_path = vtt_path.replace('.vtt', '.srt')
         
+        # An SRT written after the VTT last changed is already its conversion
+        try:
+            if os.stat(srt_path).st_mtime_ns >= os.stat(vtt_path).st_mtime_ns:
+                return srt_path
+        except OSError:
+            pass
+        
         try:
-            vtt = webvtt.read(vtt_path)
-            subs = pysrt.SubRipFile()
-            
-            for i, caption in enumerate(vtt):
-                sub = pysrt.SubRipItem()
-                sub.index = i + 1
-                sub.text = caption.text
-                
-                start_parts = caption.start.split(':')
-                hours, minutes, seconds = start_parts[0], start_parts[1], start_parts[2].replace('.', ',')
-                sub.start.hours = int(hours)
-                sub.start.minutes = int(minutes)
-                sub.start.seconds = int(float(seconds.replace(',', '.')))
-                sub.start.milliseconds = int((float(seconds.replace(',', '.')) % 1) * 1000)
-                
-                end_parts = caption.end.split(':')
-                hours, minutes, seconds = end_parts[0], end_parts[1], end_parts[2].replace('.', ',')
-                sub.end.hours = int(hours)
-                sub.end.minutes = int(minutes)
-                sub.end.seconds = int(float(seconds.replace(',', '.')))
-                sub.end.milliseconds = int((float(seconds.replace(',', '.')) % 1) * 1000)
-                
-                subs.append(sub)
-            
-            subs.save(srt_path, encoding='utf-8')
+            with open(vtt_path, 'r', encoding='utf-8-sig') as f:
+                content = f.read().replace('\r\n', '\n')
+            
+            blocks = []
+            # Cues are separated by blank lines; header, NOTE and STYLE blocks have no timing line
+            for block in content.split('\n\n'):
+                timing = VTT_CUE_TIMING_PATTERN.search(block)
+                if not timing:
+                    continue
+                
+                cue_lines = block[timing.end():].split('\n')[1:]
+                text = '\n'.join(VTT_TAG_PATTERN.sub('', line) for line in cue_lines).strip()
+                if not text:
+                    continue
+                
+                start = VTT_TIMESTAMP_PATTERN.match(timing.group(1)).groups()
+                end = VTT_TIMESTAMP_PATTERN.match(timing.group(2)).groups()
+                blocks.append(
+                    f"{len(blocks) + 1}\n"
+                    f"{int(start[0] or 0):02d}:{start[1]}:{start[2]},{start[3].ljust(3, '0')[:3]} --> "
+                    f"{int(end[0] or 0):02d}:{end[1]}:{end[2]},{end[3].ljust(3, '0')[:3]}\n"
+                    f"{text}\n"
+                )
+            
+            with open(srt_path, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(blocks))
             return srt_path
             
         except Exception as e: